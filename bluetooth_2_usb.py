@@ -7,9 +7,10 @@ from typing import NoReturn
 
 import usb_hid
 
-from src.bluetooth_2_usb.args import parse_args
+from src.bluetooth_2_usb.args import Arguments, parse_args
 from src.bluetooth_2_usb.logging import add_file_handler, get_logger
 from src.bluetooth_2_usb.relay import RelayController, async_list_input_devices
+from src.bluetooth_2_usb.tuning import apply_realtime_settings, run
 
 
 logger = get_logger()
@@ -27,13 +28,12 @@ for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT):
     signal.signal(sig, signal_handler)
 
 
-async def main() -> NoReturn:
+async def main(args: Arguments) -> NoReturn:
     """
-    Parses command-line arguments, sets up logging and starts the event loop which
+    Sets up logging according to the command-line arguments and starts relaying, i.e.,
     reads events from the input devices and forwards them to the corresponding USB
     gadget device.
     """
-    args = parse_args()
     if args.debug:
         logger.setLevel(DEBUG)
     if args.version:
@@ -47,9 +47,27 @@ async def main() -> NoReturn:
         log_handlers_message += f" and to {args.log_path}"
     logger.debug(f"CLI args: {args}")
     logger.debug(log_handlers_message)
+    logger.debug(f"Event loop: {type(asyncio.get_running_loop()).__module__}")
     logger.info(f"Launching {VERSIONED_NAME}")
-
-    controller = RelayController(args.device_ids, args.auto_discover, args.grab_devices)
+    apply_realtime_settings(args.rt_priority, args.cpu_affinity, args.lock_memory)
+
+    controller = RelayController(
+        args.device_ids,
+        args.auto_discover,
+        args.grab_devices,
+        args.threaded_writes,
+        args.hi_res_mouse,
+        args.nkro_keyboard,
+        args.poll_interval,
+        args.max_packet_size,
+        args.reconnect_backoff,
+        args.multiplex,
+        args.low_jitter,
+        args.idle_gc,
+        args.read_buffer,
+        args.discover_filter,
+        args.exclude_ids,
+    )
     await controller.async_relay_devices()
 
 
@@ -77,7 +95,8 @@ if __name__ == "__main__":
     """
     Entry point for the script.
     """
+    args = parse_args()
     try:
-        asyncio.run(main())
+        run(main(args), args.event_loop)
     except Exception:
         logger.exception("Houston, we have an unhandled problem. Abort mission.")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Checks with tracemalloc how much memory the relay hot path allocates per input event.
+
+Keyboard and mouse frames are packed as raw input_event records, written to a pipe and relayed
+through the same reader, translation and report code as real devices. The reports go to null
+writers, so neither the USB gadgets nor an input device are involved and it runs anywhere:
+
+    venv/bin/python3.11 scripts/benchmark_allocations.py
+
+Exits with status 1 if memory blocks remain allocated per event after the warmup, e.g., because
+the hot path keeps references to events or reports.
+"""
+
+import argparse
+import gc
+import os
+from pathlib import Path
+import sys
+import tracemalloc
+
+from adafruit_hid.consumer_control import ConsumerControl
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb import relay
+from src.bluetooth_2_usb.evdev import ecodes
+from src.bluetooth_2_usb.relay import (
+    INPUT_EVENT,
+    DeviceRelay,
+    HiResMouseReport,
+    KeyboardReport,
+    RawEventReader,
+)
+
+
+class NullWriter:
+    """
+    Takes the reports of one gadget and discards them.
+    """
+
+    def __init__(self, usage_page: int, usage: int) -> None:
+        self.usage_page = usage_page
+        self.usage = usage
+
+    def send_report(self, report: bytes, report_id=None) -> None:
+        pass
+
+
+class PipeDevice:
+    """
+    Stands in for an InputDevice, with the read end of a pipe as its fd.
+    """
+
+    name = "allocation benchmark"
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+
+
+def init_null_gadgets() -> None:
+    """
+    Lets the relays send their reports to null writers instead of the USB gadgets.
+    """
+    relay._keyboard_gadget = KeyboardReport(NullWriter(0x01, 0x06))
+    relay._mouse_gadget = HiResMouseReport(NullWriter(0x01, 0x02))
+    relay._consumer_gadget = ConsumerControl([NullWriter(0x0C, 0x01)])
+
+
+def _pack_frames() -> bytes:
+    events = [
+        (ecodes.EV_KEY, ecodes.KEY_A, 1),
+        (ecodes.EV_SYN, ecodes.SYN_REPORT, 0),
+        (ecodes.EV_KEY, ecodes.KEY_A, 0),
+        (ecodes.EV_SYN, ecodes.SYN_REPORT, 0),
+        (ecodes.EV_REL, ecodes.REL_X, 3),
+        (ecodes.EV_REL, ecodes.REL_Y, -2),
+        (ecodes.EV_SYN, ecodes.SYN_REPORT, 0),
+        (ecodes.EV_KEY, ecodes.BTN_LEFT, 1),
+        (ecodes.EV_SYN, ecodes.SYN_REPORT, 0),
+        (ecodes.EV_KEY, ecodes.BTN_LEFT, 0),
+        (ecodes.EV_SYN, ecodes.SYN_REPORT, 0),
+    ]
+    return b"".join(INPUT_EVENT.pack(0, 0, *event) for event in events)
+
+
+def _relay_batches(
+    device_relay: DeviceRelay, write_fd: int, data: bytes, count: int
+) -> None:
+    (node,) = device_relay._nodes.values()
+    for _ in range(count):
+        os.write(write_fd, data)
+        device_relay._relay_events(node, node.reader.read_available())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Checks the memory the relay hot path allocates per input event."
+    )
+    parser.add_argument(
+        "--batches",
+        type=int,
+        default=10000,
+        help="Batches of keyboard and mouse frames to relay. Default: 10000",
+    )
+    args = parser.parse_args()
+
+    init_null_gadgets()
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    device_relay = DeviceRelay(PipeDevice(read_fd))  # type: ignore
+    data = _pack_frames()
+    assert len(data) <= INPUT_EVENT.size * RawEventReader.BUFFERED_EVENTS
+    events_per_batch = len(data) // INPUT_EVENT.size
+
+    gc.disable()
+    tracemalloc.start()
+    # Warm up caches and free lists
+    _relay_batches(device_relay, write_fd, data, 100)
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base_size, _ = tracemalloc.get_traced_memory()
+    _relay_batches(device_relay, write_fd, data, args.batches)
+    _, peak_size = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    gc.enable()
+
+    events = args.batches * events_per_batch
+    own_traces = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    statistics = after.filter_traces(own_traces).compare_to(
+        before.filter_traces(own_traces), "lineno"
+    )
+    blocks = sum(stat.count_diff for stat in statistics if stat.count_diff > 0)
+    print(f"Relayed {events} events in {args.batches} batches")
+    print(f"Blocks still allocated per event: {blocks / events:.4f}")
+    print(f"Peak transient memory per batch: {peak_size - base_size} bytes")
+    for stat in statistics[:5]:
+        if stat.count_diff > 0:
+            print(f"  {stat}")
+    sys.exit(1 if blocks / events > 0.01 else 0)
+
+
+if __name__ == "__main__":
+    main()
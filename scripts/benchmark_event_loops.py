@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compares the asyncio and uvloop event loops (--event_loop) on the relay pipeline.
+
+Mouse movement frames are stamped with the current time, packed as raw input_event records and
+written to a pipe from a separate thread. A relay reads them through the same reader,
+translation and report code as real devices, and sends the reports to a null writer recording
+when each report was sent. Neither the USB gadgets nor an input device are involved:
+
+    venv/bin/python3.11 scripts/benchmark_event_loops.py
+"""
+
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+
+from benchmark_allocations import NullWriter, PipeDevice, init_null_gadgets
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb import relay
+from src.bluetooth_2_usb.evdev import ecodes
+from src.bluetooth_2_usb.relay import INPUT_EVENT, DeviceRelay, HiResMouseReport
+from src.bluetooth_2_usb.tuning import ASYNCIO, UVLOOP, get_loop_factory
+
+
+class TimingWriter(NullWriter):
+    """
+    Records when each report is sent.
+    """
+
+    def __init__(self, usage_page: int, usage: int) -> None:
+        super().__init__(usage_page, usage)
+        self.sent: list[float] = []
+
+    def send_report(self, report: bytes, report_id=None) -> None:
+        self.sent.append(time.time())
+
+
+def _feed(write_fd: int, frames: int, rate: float, stamps: list[float]) -> None:
+    interval = 1 / rate
+    for _ in range(frames):
+        now = time.time()
+        sec, usec = int(now), int(now % 1 * 1_000_000)
+        os.write(
+            write_fd,
+            INPUT_EVENT.pack(sec, usec, ecodes.EV_REL, ecodes.REL_X, 1)
+            + INPUT_EVENT.pack(sec, usec, ecodes.EV_SYN, ecodes.SYN_REPORT, 0),
+        )
+        stamps.append(sec + usec / 1_000_000)
+        time.sleep(interval)
+
+
+async def _async_run(frames: int, rate: float) -> tuple[list[float], float]:
+    mouse_writer = TimingWriter(0x01, 0x02)
+    relay._mouse_gadget = HiResMouseReport(mouse_writer)
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    device_relay = DeviceRelay(PipeDevice(read_fd))  # type: ignore
+    task = asyncio.create_task(device_relay.async_relay_events_loop())
+    stamps: list[float] = []
+    feeder = threading.Thread(target=_feed, args=(write_fd, frames, rate, stamps))
+    cpu_start = time.thread_time()
+    feeder.start()
+    while feeder.is_alive() or len(mouse_writer.sent) < len(stamps):
+        await asyncio.sleep(0.05)
+    cpu = time.thread_time() - cpu_start
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    os.close(read_fd)
+    os.close(write_fd)
+    latencies = [sent - stamp for sent, stamp in zip(mouse_writer.sent, stamps)]
+    return latencies, cpu
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    return sorted(values)[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compares the asyncio and uvloop event loops on the relay pipeline."
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=5000,
+        help="Mouse frames to relay per event loop. Default: 5000",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1000.0,
+        help="Frames per second. Default: 1000",
+    )
+    args = parser.parse_args()
+
+    init_null_gadgets()
+    print(f"{'loop':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'cpu us/event':>13}")
+    for event_loop in (ASYNCIO, UVLOOP):
+        loop_factory = get_loop_factory(event_loop)
+        if event_loop == UVLOOP and loop_factory is None:
+            print(f"{event_loop:>8} not installed")
+            continue
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            latencies, cpu = runner.run(_async_run(args.frames, args.rate))
+        print(
+            f"{event_loop:>8} "
+            f"{_percentile(latencies, 0.5) * 1000:>8.3f} "
+            f"{_percentile(latencies, 0.99) * 1000:>8.3f} "
+            f"{max(latencies) * 1000:>8.3f} "
+            f"{cpu / (args.frames * 2) * 1_000_000:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
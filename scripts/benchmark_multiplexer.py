@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Compares relaying input events with one task per device against the single epoll multiplexer
+(--multiplex), for 1 up to 32 virtual input devices.
+
+Each virtual device is created through uinput and fed mouse movement frames from a separate
+thread. The relays only time the events instead of sending them to the USB gadgets, so neither
+the gadgets nor the host are involved. Needs access to /dev/uinput, e.g., run as root:
+
+    sudo venv/bin/python3.11 scripts/benchmark_multiplexer.py
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+import sys
+import threading
+import time
+
+from evdev import InputDevice, UInput, ecodes
+
+from benchmark_allocations import init_null_gadgets
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb.relay import DeviceRelay, EventMultiplexer, RawEvent
+
+
+DEVICE_COUNTS = (1, 2, 4, 8, 16, 32)
+
+
+class TimingRelay(DeviceRelay):
+    """
+    Relay that records the delay from each event's kernel timestamp to its dispatch instead of
+    translating the events.
+    """
+
+    def __init__(self, input_device: InputDevice, latencies: list[float]) -> None:
+        super().__init__(input_device)
+        self._latencies = latencies
+
+    def _relay_events(self, node, events: list[RawEvent] | tuple[RawEvent]) -> None:
+        now = time.time()
+        for sec, usec, type, _, _ in events:
+            if type == ecodes.EV_SYN:
+                self._latencies.append(now - sec - usec / 1_000_000)
+
+
+def _feed(
+    devices: list[UInput], frames: int, rate: float, stop: threading.Event
+) -> None:
+    interval = 1 / rate
+    for _ in range(frames):
+        if stop.is_set():
+            return
+        for device in devices:
+            device.write(ecodes.EV_REL, ecodes.REL_X, 1)
+            device.write(ecodes.EV_REL, ecodes.REL_Y, 1)
+            device.syn()
+        time.sleep(interval)
+
+
+async def _async_run(count: int, multiplex: bool, frames: int, rate: float) -> tuple:
+    capabilities = {ecodes.EV_REL: [ecodes.REL_X, ecodes.REL_Y]}
+    uinputs = [
+        UInput(capabilities, name=f"benchmark-{index}") for index in range(count)
+    ]
+    # Give udev time to create the nodes
+    await asyncio.sleep(0.5)
+    devices = [InputDevice(uinput.device.path) for uinput in uinputs]
+    latencies: list[float] = []
+    relays = [TimingRelay(device, latencies) for device in devices]
+    multiplexer = EventMultiplexer()
+    if multiplex:
+        tasks = [asyncio.create_task(multiplexer.async_relay(r)) for r in relays]
+    else:
+        tasks = [asyncio.create_task(r.async_relay_events_loop()) for r in relays]
+    stop = threading.Event()
+    feeder = threading.Thread(target=_feed, args=(uinputs, frames, rate, stop))
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    feeder.start()
+    try:
+        while feeder.is_alive():
+            await asyncio.sleep(0.05)
+        # Let the relays catch up with the last frames
+        await asyncio.sleep(0.1)
+    finally:
+        stop.set()
+        wall = time.monotonic() - wall_start
+        cpu = time.process_time() - cpu_start
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for device in devices:
+            device.close()
+        for uinput in uinputs:
+            uinput.close()
+    return latencies, count * frames, wall, cpu
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    return sorted(values)[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def async_main(frames: int, rate: float) -> None:
+    init_null_gadgets()
+    print(
+        f"{'devices':>7} {'engine':>11} {'frames':>8} {'lost':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'cpu %':>6}"
+    )
+    for count in DEVICE_COUNTS:
+        for multiplex in (False, True):
+            latencies, sent, wall, cpu = await _async_run(
+                count, multiplex, frames, rate
+            )
+            engine = "multiplexer" if multiplex else "tasks"
+            print(
+                f"{count:>7} {engine:>11} {sent:>8} {sent - len(latencies):>6} "
+                f"{_percentile(latencies, 0.5) * 1000:>8.3f} "
+                f"{_percentile(latencies, 0.99) * 1000:>8.3f} "
+                f"{max(latencies, default=float('nan')) * 1000:>8.3f} "
+                f"{cpu / wall * 100:>6.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the relay engines with 1 up to 32 virtual input devices."
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=1000,
+        help="Frames to send per device. Default: 1000",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=500.0,
+        help="Frames per second and device. Default: 500",
+    )
+    args = parser.parse_args()
+    asyncio.run(async_main(args.frames, args.rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Compares the precompiled scancode translation table of evdev.py with the former lookup, which
+scanned dir(ecodes) and dir(Keycode) through lru_caches on every key event.
+
+Both translate a mix of keyboard, consumer and mouse scancodes the way the relay used to for
+each key event: evdev_to_usb_hid, is_consumer_key and is_mouse_button, at INFO log level.
+Neither the USB gadgets nor an input device are involved:
+
+    venv/bin/python3.11 scripts/benchmark_translation.py
+
+Exits with status 1 if any scancode translates to a different UsageID or key name than before.
+"""
+
+import argparse
+from functools import lru_cache
+from pathlib import Path
+import sys
+import timeit
+from types import SimpleNamespace
+
+from adafruit_hid.consumer_control_code import ConsumerControlCode
+from adafruit_hid.keycode import Keycode
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb import evdev
+from src.bluetooth_2_usb.evdev import (
+    ExtendedMouseButton,
+    ecodes,
+    evdev_to_usb_hid,
+    find_key_name,
+    is_consumer_key,
+    is_mouse_button,
+)
+from src.bluetooth_2_usb.logging import get_logger
+
+
+_logger = get_logger()
+
+SCANCODES = (
+    ecodes.KEY_A,
+    ecodes.KEY_ENTER,
+    ecodes.KEY_LEFTSHIFT,
+    ecodes.KEY_SPACE,
+    ecodes.KEY_F5,
+    ecodes.KEY_VOLUMEUP,
+    ecodes.KEY_PLAYPAUSE,
+    ecodes.BTN_LEFT,
+    ecodes.BTN_RIGHT,
+)
+
+
+@lru_cache(maxsize=512)
+def _cached_getattr(class_type, attribute):
+    return getattr(class_type, attribute, None)
+
+
+@lru_cache()
+def _cached_dir(class_type: type) -> list[str]:
+    return dir(class_type)
+
+
+def _former_is_consumer_key(event) -> bool:
+    return event.scancode in evdev._CONSUMER_KEYS
+
+
+def _former_is_mouse_button(event) -> bool:
+    return event.scancode in evdev._MOUSE_BUTTONS
+
+
+def _former_find_key_name(event) -> str | None:
+    scancode = event.scancode
+    for attribute in _cached_dir(ecodes):
+        if _cached_getattr(ecodes, attribute) == scancode and attribute.startswith(
+            ("KEY_", "BTN_")
+        ):
+            return attribute
+    return None
+
+
+def _former_find_usage_name(event, hid_usage_id: int | None) -> str | None:
+    if _former_is_consumer_key(event):
+        code_type = ConsumerControlCode
+    elif _former_is_mouse_button(event):
+        code_type = ExtendedMouseButton
+    else:
+        code_type = Keycode
+    for attribute in _cached_dir(code_type):
+        if _cached_getattr(code_type, attribute) == hid_usage_id:
+            return attribute
+    return None
+
+
+def _former_evdev_to_usb_hid(event) -> tuple[int | None, str | None]:
+    scancode = event.scancode
+    key_name = _former_find_key_name(event)
+    hid_usage_id = evdev._EVDEV_TO_USB_HID.get(scancode, None)
+    hid_usage_name = _former_find_usage_name(event, hid_usage_id)
+    if any(item is None for item in (key_name, hid_usage_id, hid_usage_name)):
+        _logger.warning(f"Unsupported key pressed: 0x{scancode:02X}")
+    else:
+        _logger.debug(
+            f"Converted evdev scancode 0x{scancode:02X} ({key_name}) to HID UsageID 0x{hid_usage_id:02X} ({hid_usage_name})"
+        )
+    return hid_usage_id, hid_usage_name
+
+
+def _translate_former(events: list) -> None:
+    for event in events:
+        _former_evdev_to_usb_hid(event)
+        _former_is_consumer_key(event)
+        _former_is_mouse_button(event)
+
+
+def _translate(events: list) -> None:
+    for event in events:
+        evdev_to_usb_hid(event)
+        is_consumer_key(event)
+        is_mouse_button(event)
+
+
+def _count_mismatches() -> int:
+    mismatches = 0
+    for scancode in range(ecodes.KEY_CNT):
+        event = SimpleNamespace(scancode=scancode)
+        former = evdev._EVDEV_TO_USB_HID.get(scancode), _former_find_key_name(event)
+        mapping = evdev.get_hid_mapping(scancode)
+        current = mapping.hid_usage_id if mapping else None, find_key_name(event)
+        if former != current:
+            print(f"  0x{scancode:03X}: {former} before, {current} now")
+            mismatches += 1
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compares the scancode translation table with the former lookup."
+    )
+    parser.add_argument(
+        "--events",
+        type=int,
+        default=2000,
+        help="Key events to translate per run. Default: 2000",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs, the best counts. Default: 5"
+    )
+    args = parser.parse_args()
+
+    events = [
+        SimpleNamespace(scancode=SCANCODES[i % len(SCANCODES)])
+        for i in range(args.events)
+    ]
+    for name, translate in (("before", _translate_former), ("after", _translate)):
+        times = timeit.repeat(lambda: translate(events), number=1, repeat=args.repeat)
+        best = min(times)
+        print(f"{name:>7}: {best / args.events * 1_000_000:8.1f} us per key event")
+
+    mismatches = _count_mismatches()
+    print(f"Scancodes translating differently: {mismatches} of {ecodes.KEY_CNT}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Checks the capability filters of --discover_filter against the capability bitmaps of typical
+input devices, e.g., that a power button is not taken for a consumer control device. Nothing
+is opened, so it runs anywhere:
+
+    venv/bin/python3.11 scripts/check_discover_filter.py
+
+Exits with status 1 if any device is classified unexpectedly.
+"""
+
+from pathlib import Path
+import sys
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb.discovery import CAPABILITIES, DeviceInfo
+from src.bluetooth_2_usb.evdev import CONSUMER, KEYBOARD, MOUSE, ecodes
+
+
+def _bits(*codes: int) -> int:
+    return sum(1 << code for code in codes)
+
+
+def _device(
+    name: str, keys: tuple[int, ...] = (), rels: tuple[int, ...] = ()
+) -> DeviceInfo:
+    ev_bits = _bits(ecodes.EV_SYN)
+    if keys:
+        ev_bits |= _bits(ecodes.EV_KEY)
+    if rels:
+        ev_bits |= _bits(ecodes.EV_REL)
+    return DeviceInfo(
+        f"/dev/input/{name}", name, "", "", ev_bits, _bits(*keys), _bits(*rels)
+    )
+
+
+KEYBOARD_KEYS = tuple(range(ecodes.KEY_ESC, ecodes.KEY_MICMUTE + 1))
+
+DEVICES = [
+    (_device("Power Button", (ecodes.KEY_POWER,)), set()),
+    (_device("Sleep Button", (ecodes.KEY_SLEEP,)), set()),
+    (
+        _device("gpio-keys", (ecodes.KEY_POWER, ecodes.KEY_WAKEUP, ecodes.KEY_RESTART)),
+        set(),
+    ),
+    (_device("Lid Switch"), set()),
+    (_device("Accelerometer"), set()),
+    (_device("Keyboard", KEYBOARD_KEYS), {KEYBOARD, CONSUMER}),
+    (
+        _device("Consumer Control", (ecodes.KEY_VOLUMEUP, ecodes.KEY_PLAYPAUSE)),
+        {CONSUMER},
+    ),
+    (
+        _device(
+            "Mouse", (ecodes.BTN_LEFT, ecodes.BTN_RIGHT), (ecodes.REL_X, ecodes.REL_Y)
+        ),
+        {MOUSE},
+    ),
+    (_device("Wheel only", rels=(ecodes.REL_WHEEL,)), set()),
+]
+
+
+def main() -> None:
+    failures = 0
+    for device, expected in DEVICES:
+        actual = {c for c in CAPABILITIES if device.has_capability(c)}
+        status = "ok" if actual == expected else "FAILED"
+        failures += actual != expected
+        print(f"{device.name:>18}: {', '.join(sorted(actual)) or '-':<18} {status}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
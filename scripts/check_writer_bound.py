@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Checks that the HID report writers never queue more than max_queue_size reports while the
+gadget does not take any, e.g., because the host is suspended, and that the latest report is
+the last one sent once the gadget takes reports again.
+
+The non-blocking writer writes to a FIFO that nobody reads until it is full, the threaded
+writer to a device whose send_report() blocks. Neither the USB gadgets nor the host are
+involved:
+
+    venv/bin/python3.11 scripts/check_writer_bound.py
+
+Exits with status 1 if a queue exceeds its bound or the latest report is lost.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+import sys
+import tempfile
+import threading
+from types import SimpleNamespace
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb.gadgets import ExecutorHidWriter, HidWriter
+
+REPORTS = 20_000
+MAX_QUEUE_SIZE = 16
+REPORT_ID = 1
+
+
+def _report(i: int) -> bytes:
+    """
+    Keyboard reports that can never be merged, each with a different key held.
+    """
+    return bytes((0, 0, 4 + i % 100, 0, 0, 0, 0, i % 256))
+
+
+def _fake_device(path: str = "") -> SimpleNamespace:
+    return SimpleNamespace(
+        path=path,
+        report_ids=[REPORT_ID],
+        in_report_lengths=[8],
+        usage_page=0x01,
+        usage=0x06,
+    )
+
+
+def _read_available(fd: int) -> bytes:
+    data = b""
+    while True:
+        try:
+            chunk = os.read(fd, 65536)
+        except BlockingIOError:
+            return data
+        if not chunk:
+            return data
+        data += chunk
+
+
+async def _check_hid_writer(fifo: str) -> bool:
+    read_fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+    writer = HidWriter(_fake_device(fifo), MAX_QUEUE_SIZE)  # type: ignore
+    max_depth = 0
+    for i in range(REPORTS):
+        writer.send_report(_report(i))
+        max_depth = max(max_depth, writer.queue_depth)
+    replaced = writer.replaced_reports
+    written = b""
+    while True:
+        written += _read_available(read_fd)
+        if not writer.queue_depth:
+            break
+        # Let the event loop write the queued reports
+        await asyncio.sleep(0.01)
+    written += _read_available(read_fd)
+    writer.close()
+    os.close(read_fd)
+    latest_last = written[-9:] == bytes((REPORT_ID,)) + _report(REPORTS - 1)
+    print(
+        f"HidWriter: max queue depth {max_depth} of {MAX_QUEUE_SIZE}, "
+        f"{replaced} reports replaced, latest report sent last: {latest_last}"
+    )
+    return max_depth <= MAX_QUEUE_SIZE and latest_last
+
+
+def _check_executor_hid_writer() -> bool:
+    unblocked = threading.Event()
+    sent: list[bytes] = []
+
+    def send_report(report: bytes) -> None:
+        unblocked.wait()
+        sent.append(report)
+
+    device = _fake_device()
+    device.send_report = send_report
+    writer = ExecutorHidWriter(device, MAX_QUEUE_SIZE)  # type: ignore
+    max_depth = 0
+    for i in range(REPORTS):
+        writer.send_report(_report(i))
+        max_depth = max(max_depth, writer.queue_depth)
+    replaced = writer.replaced_reports
+    unblocked.set()
+    while writer.queue_depth:
+        threading.Event().wait(0.01)
+    writer.close()
+    latest_last = bool(sent) and sent[-1] == _report(REPORTS - 1)
+    print(
+        f"ExecutorHidWriter: max queue depth {max_depth} of {MAX_QUEUE_SIZE}, "
+        f"{replaced} reports replaced, latest report sent last: {latest_last}"
+    )
+    return max_depth <= MAX_QUEUE_SIZE and latest_last
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        fifo = os.path.join(directory, "hidg")
+        os.mkfifo(fifo)
+        ok = asyncio.run(_check_hid_writer(fifo))
+    ok = _check_executor_hid_writer() and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
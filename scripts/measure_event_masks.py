@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Measures on a real device how many events and wakeups the relay's kernel-side event masks
+(EVIOCSMASK) filter out.
+
+The device is opened twice and both fds receive the same input, but only the second one gets
+the relay's event masks. While you use the device, events and wakeups are counted per fd:
+
+    sudo venv/bin/python3.11 scripts/measure_event_masks.py /dev/input/event3
+"""
+
+import argparse
+from collections import Counter
+import os
+from pathlib import Path
+import select
+import sys
+import time
+
+# Import the package the same way bluetooth_2_usb.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.bluetooth_2_usb.relay import RawEventReader, get_event_masks, set_event_masks
+
+
+EVENT_TYPE_NAMES = {
+    0x00: "EV_SYN",
+    0x01: "EV_KEY",
+    0x02: "EV_REL",
+    0x03: "EV_ABS",
+    0x04: "EV_MSC",
+    0x05: "EV_SW",
+    0x11: "EV_LED",
+    0x12: "EV_SND",
+    0x14: "EV_REP",
+    0x15: "EV_FF",
+    0x16: "EV_PWR",
+    0x17: "EV_FF_STATUS",
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measures the events and wakeups the relay's event masks filter out."
+    )
+    parser.add_argument("device", help="Input device path, e.g., /dev/input/event3")
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=30.0,
+        help="Duration of the measurement. Default: 30",
+    )
+    parser.add_argument(
+        "--hi_res_mouse",
+        action="store_true",
+        default=False,
+        help="Use the masks of the high-resolution mouse gadget.",
+    )
+    args = parser.parse_args()
+
+    fds = [os.open(args.device, os.O_RDONLY | os.O_NONBLOCK) for _ in range(2)]
+    set_event_masks(fds[1], get_event_masks(args.hi_res_mouse))
+    readers = {fd: RawEventReader(fd) for fd in fds}
+    counts = {fd: Counter() for fd in fds}
+    wakeups = Counter()
+    print(f"Use {args.device} for {args.seconds:.0f} s...")
+    end = time.monotonic() + args.seconds
+    while (timeout := end - time.monotonic()) > 0:
+        ready, _, _ = select.select(fds, [], [], timeout)
+        for fd in ready:
+            events = readers[fd].read_available()
+            if events:
+                wakeups[fd] += 1
+                counts[fd].update(event[2] for event in events)
+    for fd in fds:
+        os.close(fd)
+
+    print(f"{'':>14} {'unmasked/s':>11} {'masked/s':>11}")
+    for type in sorted(counts[fds[0]].keys() | counts[fds[1]].keys()):
+        name = EVENT_TYPE_NAMES.get(type, f"0x{type:02X}")
+        print(
+            f"{name:>14} {counts[fds[0]][type] / args.seconds:>11.1f} "
+            f"{counts[fds[1]][type] / args.seconds:>11.1f}"
+        )
+    totals = [sum(counts[fd].values()) / args.seconds for fd in fds]
+    print(f"{'events':>14} {totals[0]:>11.1f} {totals[1]:>11.1f}")
+    print(
+        f"{'wakeups':>14} {wakeups[fds[0]] / args.seconds:>11.1f} "
+        f"{wakeups[fds[1]] / args.seconds:>11.1f}"
+    )
+    print(f"Filtered {totals[0] - totals[1]:.1f} events/s")
+
+
+if __name__ == "__main__":
+    main()
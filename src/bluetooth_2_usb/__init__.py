@@ -3,19 +3,55 @@
 # --------------------------------------------------------------------------
 
 from .args import Arguments, parse_args
+from .discovery import DeviceInfo, DeviceInfoCache, InputDeviceWatcher
 from .evdev import (
+    ExtendedMouseButton,
+    HidMapping,
     ecodes,
     evdev_to_usb_hid,
     find_key_name,
     find_usage_name,
+    get_hid_mapping,
     get_mouse_movement,
+    get_translatable_scancodes,
     is_consumer_key,
     is_mouse_button,
 )
+from .gadgets import (
+    HI_RES_MOUSE,
+    NKRO_KEYBOARD,
+    ExecutorHidWriter,
+    HidFunctionConfig,
+    HidWriter,
+    configure_hid_functions,
+    create_hid_writer,
+    merge_hi_res_mouse_reports,
+    log_hid_functions,
+    merge_mouse_reports,
+)
 from .logging import add_file_handler, get_logger
 from .relay import (
+    Backoff,
     DeviceIdentifier,
+    DeviceIdentifierIndex,
     DeviceRelay,
+    EventMultiplexer,
+    HiResMouseReport,
+    KeyboardReport,
+    NkroKeyboardReport,
+    RawEventReader,
     RelayController,
     async_list_input_devices,
+    close_usb_gadgets,
+    get_device_infos,
+    get_event_masks,
+    get_queue_depths,
+    set_event_masks,
+)
+from .tuning import (
+    IdleCollector,
+    apply_realtime_settings,
+    freeze_gc,
+    get_loop_factory,
+    run,
 )
@@ -5,6 +5,11 @@ from typing import Optional
 
 import usb_hid
 
+from .discovery import CAPABILITIES
+from .evdev import CONSUMER, KEYBOARD, MOUSE
+from .relay import DeviceIdentifier
+from .tuning import AUTO, EVENT_LOOPS
+
 
 class CustomArgumentParser(argparse.ArgumentParser):
     def __init__(self, *args, **kwargs) -> None:
@@ -22,9 +27,9 @@ class CustomArgumentParser(argparse.ArgumentParser):
         self.add_argument(
             "--device_ids",
             "-i",
-            type=lambda input: [item.strip() for item in input.split(",")],
+            type=_parse_identifiers,
             default=None,
-            help="Comma-separated list of identifiers for input devices to be relayed.\nAn identifier is either the input device path, the MAC address or any case-insensitive substring of the device name.\nExample: --device_ids '/dev/input/event2,a1:b2:c3:d4:e5:f6,0A-1B-2C-3D-4E-5F,logi'\nDefault: None",
+            help="Comma-separated list of identifiers for input devices to be relayed.\nAn identifier is either the input device path, the MAC address or any case-insensitive substring of the device name.\nIdentifiers starting with 'glob:' are globs matching the whole name, or the whole path if the glob starts with '/'. Identifiers starting with 're:' are regular expressions searched for in the name.\nExample: --device_ids '/dev/input/event2,a1:b2:c3:d4:e5:f6,0A-1B-2C-3D-4E-5F,logi,glob:apple*keyboard,re:^mx (keys|master)'\nDefault: None",
         )
         self.add_argument(
             "--auto_discover",
@@ -33,6 +38,20 @@ class CustomArgumentParser(argparse.ArgumentParser):
             default=False,
             help="Enable auto-discovery mode. All readable input devices will be relayed automatically.\nDefault: disabled",
         )
+        self.add_argument(
+            "--discover_filter",
+            "-y",
+            type=_parse_capabilities,
+            default=None,
+            help="Comma-separated list of capabilities, of which auto-discovered devices need at least one: keyboard (letter keys), mouse (X and Y movement) or consumer (e.g., media keys).\nSkips, e.g., power buttons, lid switches and accelerometers.\nExample: --discover_filter 'keyboard,mouse,consumer'\nDefault: None (all devices)",
+        )
+        self.add_argument(
+            "--exclude_ids",
+            "-q",
+            type=_parse_identifiers,
+            default=None,
+            help="Comma-separated list of identifiers for input devices never to be relayed, even if they match --device_ids or are auto-discovered.\nIdentifiers are the same as for --device_ids.\nExample: --exclude_ids 'vc4-hdmi,gpio-keys'\nDefault: None",
+        )
         self.add_argument(
             "--grab_devices",
             "-g",
@@ -40,6 +59,104 @@ class CustomArgumentParser(argparse.ArgumentParser):
             default=False,
             help="Grab the input devices, i.e., suppress any events on your relay device.\nDevices are not grabbed by default.",
         )
+        self.add_argument(
+            "--threaded_writes",
+            "-t",
+            action="store_true",
+            default=False,
+            help="Write HID reports from a worker thread per USB gadget (blocking I/O) instead of non-blocking from the event loop.\nDefault: disabled",
+        )
+        self.add_argument(
+            "--hi_res_mouse",
+            "-r",
+            action="store_true",
+            default=False,
+            help="Emulate a high-resolution mouse with 16-bit movement, horizontal wheel and high-resolution scrolling.\nRequires a host supporting the HID resolution multiplier (e.g., Windows 8+ or Linux 5.0+).\nDefault: disabled",
+        )
+        self.add_argument(
+            "--nkro_keyboard",
+            "-k",
+            action="store_true",
+            default=False,
+            help="Emulate an N-key rollover keyboard, i.e., any number of keys can be pressed at once instead of six.\nFalls back to six keys for BIOS and other boot protocol hosts.\nDefault: disabled",
+        )
+        self.add_argument(
+            "--poll_interval",
+            "-b",
+            type=_parse_gadget_values,
+            default=None,
+            help="USB polling interval in ms, either for all gadgets or per gadget (keyboard, mouse, consumer).\nRounded down to a power of two on high-speed USB device controllers. Ignored with a warning if the kernel does not support it.\nExample: --poll_interval 'keyboard=1,mouse=1,consumer=8'\nDefault: kernel default",
+        )
+        self.add_argument(
+            "--max_packet_size",
+            "-s",
+            type=_parse_gadget_values,
+            default=None,
+            help="Max packet size of the USB endpoints in bytes, either for all gadgets or per gadget (keyboard, mouse, consumer).\nNever smaller than the report size of the gadget.\nExample: --max_packet_size 'mouse=16'\nDefault: report size",
+        )
+        self.add_argument(
+            "--reconnect_backoff",
+            "-c",
+            type=_parse_backoff,
+            default=(1.0, 30.0),
+            help="Initial and maximum delay in seconds before relaying a device again after it failed. The delay doubles with each failure in a row.\nDevices that disconnected are relayed again as soon as they reappear.\nExample: --reconnect_backoff '0.5,10'\nDefault: 1,30",
+        )
+        self.add_argument(
+            "--multiplex",
+            "-x",
+            action="store_true",
+            default=False,
+            help="Read all input devices through one epoll instance from a single task, dispatching their events in kernel timestamp order.\nDefault: disabled (one task per input device)",
+        )
+        self.add_argument(
+            "--low_jitter",
+            "-j",
+            action="store_true",
+            default=False,
+            help="Move all objects that exist after startup into the permanent GC generation, so garbage collections stay short.\nDefault: disabled",
+        )
+        self.add_argument(
+            "--idle_gc",
+            "-z",
+            action="store_true",
+            default=False,
+            help="Disable automatic garbage collection while relaying and collect only when no events were relayed for 0.5 s.\nDefault: disabled",
+        )
+        self.add_argument(
+            "--rt_priority",
+            "-e",
+            type=_parse_rt_priority,
+            default=None,
+            help="Run the relay with real-time scheduling (SCHED_FIFO) at the given priority from 1 to 99.\nRequires root or CAP_SYS_NICE, else a warning is logged.\nExample: --rt_priority 50\nDefault: None (regular scheduling)",
+        )
+        self.add_argument(
+            "--cpu_affinity",
+            "-u",
+            type=_parse_cpus,
+            default=None,
+            help="Pin the relay to the given CPU cores, as a comma-separated list of cores or ranges.\nExample: --cpu_affinity '3' or --cpu_affinity '2-3'\nDefault: None (all cores)",
+        )
+        self.add_argument(
+            "--lock_memory",
+            "-m",
+            action="store_true",
+            default=False,
+            help="Lock all memory pages into RAM (mlockall), so page faults stay out of the relay.\nRequires root or CAP_IPC_LOCK, else a warning is logged.\nDefault: disabled",
+        )
+        self.add_argument(
+            "--event_loop",
+            "-o",
+            choices=EVENT_LOOPS,
+            default=AUTO,
+            help="Event loop implementation. With 'auto', uvloop is used if it is installed, else the default asyncio loop.\nDefault: auto",
+        )
+        self.add_argument(
+            "--read_buffer",
+            "-n",
+            type=_positive_int,
+            default=64,
+            help="Number of input events read from a device per system call, so bursts are drained with fewer reads.\nDefault: 64",
+        )
         self.add_argument(
             "--list_devices",
             "-l",
@@ -92,6 +209,97 @@ class CustomArgumentParser(argparse.ArgumentParser):
         super().print_help()
 
 
+def _parse_gadget_values(input: str) -> dict[str, int]:
+    """
+    Parses either a single positive integer for all USB gadgets or a comma-separated list of
+    gadget=value pairs.
+    """
+    gadgets = (KEYBOARD, MOUSE, CONSUMER)
+    try:
+        if "=" not in input:
+            return dict.fromkeys(gadgets, _positive_int(input))
+        values = {}
+        for item in input.split(","):
+            gadget, value = (part.strip() for part in item.split("="))
+            if gadget not in gadgets:
+                raise ValueError(f"Unknown gadget: {gadget}")
+            values[gadget] = _positive_int(value)
+        return values
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(f"Invalid gadget values '{input}': {ex}")
+
+
+def _parse_backoff(input: str) -> tuple[float, float]:
+    try:
+        initial, maximum = (float(item) for item in input.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid backoff '{input}', expected '<initial>,<maximum>'"
+        )
+    if not 0 <= initial <= maximum:
+        raise argparse.ArgumentTypeError(
+            f"Invalid backoff '{input}', expected 0 <= initial <= maximum"
+        )
+    return initial, maximum
+
+
+def _parse_identifiers(input: str) -> list[str]:
+    identifiers = [item.strip() for item in input.split(",")]
+    for identifier in identifiers:
+        try:
+            DeviceIdentifier(identifier)
+        except ValueError as ex:
+            raise argparse.ArgumentTypeError(str(ex))
+    return identifiers
+
+
+def _parse_capabilities(input: str) -> list[str]:
+    capabilities = [item.strip() for item in input.split(",")]
+    for capability in capabilities:
+        if capability not in CAPABILITIES:
+            raise argparse.ArgumentTypeError(
+                f"Unknown capability '{capability}', expected one of {', '.join(CAPABILITIES)}"
+            )
+    return capabilities
+
+
+def _parse_rt_priority(input: str) -> int:
+    try:
+        priority = int(input)
+    except ValueError:
+        priority = 0
+    if not 1 <= priority <= 99:
+        raise argparse.ArgumentTypeError(
+            f"Invalid real-time priority '{input}', expected 1 to 99"
+        )
+    return priority
+
+
+def _parse_cpus(input: str) -> set[int]:
+    """
+    Parses a comma-separated list of CPU cores and ranges, e.g., '0,2-3'.
+    """
+    cpus = set()
+    try:
+        for item in input.split(","):
+            first, _, last = item.strip().partition("-")
+            cpus.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Invalid CPU list '{input}', expected e.g. '3' or '0,2-3'"
+        )
+    if not cpus or min(cpus) < 0:
+        raise argparse.ArgumentTypeError(f"Invalid CPU list '{input}'")
+    return cpus
+
+
+def _positive_int(input: str) -> int:
+    value = int(input)
+    if value < 1:
+        raise ValueError(f"Not a positive integer: {value}")
+    return value
+
+
 class _HelpAction(argparse._HelpAction):
     def __call__(self, parser, namespace, values, option_string=None) -> None:
         parser.print_help()
@@ -102,7 +310,23 @@ class Arguments:
     __slots__ = [
         "_device_ids",
         "_auto_discover",
+        "_discover_filter",
+        "_exclude_ids",
         "_grab_devices",
+        "_threaded_writes",
+        "_hi_res_mouse",
+        "_nkro_keyboard",
+        "_poll_interval",
+        "_max_packet_size",
+        "_reconnect_backoff",
+        "_multiplex",
+        "_low_jitter",
+        "_idle_gc",
+        "_rt_priority",
+        "_cpu_affinity",
+        "_lock_memory",
+        "_event_loop",
+        "_read_buffer",
         "_list_devices",
         "_log_to_file",
         "_log_path",
@@ -114,7 +338,23 @@ class Arguments:
         self,
         device_ids: Optional[list[str]],
         auto_discover: bool,
+        discover_filter: Optional[list[str]],
+        exclude_ids: Optional[list[str]],
         grab_devices: bool,
+        threaded_writes: bool,
+        hi_res_mouse: bool,
+        nkro_keyboard: bool,
+        poll_interval: Optional[dict[str, int]],
+        max_packet_size: Optional[dict[str, int]],
+        reconnect_backoff: tuple[float, float],
+        multiplex: bool,
+        low_jitter: bool,
+        idle_gc: bool,
+        rt_priority: Optional[int],
+        cpu_affinity: Optional[set[int]],
+        lock_memory: bool,
+        event_loop: str,
+        read_buffer: int,
         list_devices: bool,
         log_to_file: bool,
         log_path: str,
@@ -123,7 +363,23 @@ class Arguments:
     ) -> None:
         self._device_ids = device_ids
         self._auto_discover = auto_discover
+        self._discover_filter = discover_filter
+        self._exclude_ids = exclude_ids
         self._grab_devices = grab_devices
+        self._threaded_writes = threaded_writes
+        self._hi_res_mouse = hi_res_mouse
+        self._nkro_keyboard = nkro_keyboard
+        self._poll_interval = poll_interval
+        self._max_packet_size = max_packet_size
+        self._reconnect_backoff = reconnect_backoff
+        self._multiplex = multiplex
+        self._low_jitter = low_jitter
+        self._idle_gc = idle_gc
+        self._rt_priority = rt_priority
+        self._cpu_affinity = cpu_affinity
+        self._lock_memory = lock_memory
+        self._event_loop = event_loop
+        self._read_buffer = read_buffer
         self._list_devices = list_devices
         self._log_to_file = log_to_file
         self._log_path = log_path
@@ -138,10 +394,74 @@ class Arguments:
     def auto_discover(self) -> bool:
         return self._auto_discover
 
+    @property
+    def discover_filter(self) -> Optional[list[str]]:
+        return self._discover_filter
+
+    @property
+    def exclude_ids(self) -> Optional[list[str]]:
+        return self._exclude_ids
+
     @property
     def grab_devices(self) -> bool:
         return self._grab_devices
 
+    @property
+    def threaded_writes(self) -> bool:
+        return self._threaded_writes
+
+    @property
+    def hi_res_mouse(self) -> bool:
+        return self._hi_res_mouse
+
+    @property
+    def nkro_keyboard(self) -> bool:
+        return self._nkro_keyboard
+
+    @property
+    def poll_interval(self) -> Optional[dict[str, int]]:
+        return self._poll_interval
+
+    @property
+    def max_packet_size(self) -> Optional[dict[str, int]]:
+        return self._max_packet_size
+
+    @property
+    def reconnect_backoff(self) -> tuple[float, float]:
+        return self._reconnect_backoff
+
+    @property
+    def multiplex(self) -> bool:
+        return self._multiplex
+
+    @property
+    def low_jitter(self) -> bool:
+        return self._low_jitter
+
+    @property
+    def idle_gc(self) -> bool:
+        return self._idle_gc
+
+    @property
+    def rt_priority(self) -> Optional[int]:
+        return self._rt_priority
+
+    @property
+    def cpu_affinity(self) -> Optional[set[int]]:
+        return self._cpu_affinity
+
+    @property
+    def lock_memory(self) -> bool:
+        return self._lock_memory
+
+    @property
+    def event_loop(self) -> str:
+        return self._event_loop
+
+    @property
+    def read_buffer(self) -> int:
+        return self._read_buffer
+
     @property
     def list_devices(self) -> bool:
         return self._list_devices
@@ -180,7 +500,23 @@ def parse_args() -> Arguments:
     return Arguments(
         device_ids=args.device_ids,
         auto_discover=args.auto_discover,
+        discover_filter=args.discover_filter,
+        exclude_ids=args.exclude_ids,
         grab_devices=args.grab_devices,
+        threaded_writes=args.threaded_writes,
+        hi_res_mouse=args.hi_res_mouse,
+        nkro_keyboard=args.nkro_keyboard,
+        poll_interval=args.poll_interval,
+        max_packet_size=args.max_packet_size,
+        reconnect_backoff=args.reconnect_backoff,
+        multiplex=args.multiplex,
+        low_jitter=args.low_jitter,
+        idle_gc=args.idle_gc,
+        rt_priority=args.rt_priority,
+        cpu_affinity=args.cpu_affinity,
+        lock_memory=args.lock_memory,
+        event_loop=args.event_loop,
+        read_buffer=args.read_buffer,
         list_devices=args.list_devices,
         log_to_file=args.log_to_file,
         log_path=args.log_path,
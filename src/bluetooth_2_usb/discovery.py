@@ -0,0 +1,360 @@
+import asyncio
+import ctypes
+import os
+import struct
+from typing import AsyncGenerator, Optional
+
+from evdev import InputDevice, list_devices
+
+from .evdev import CONSUMER, KEYBOARD, MOUSE, ecodes, get_translatable_scancodes
+from .libc import get_libc
+from .logging import get_logger
+
+
+_logger = get_logger()
+
+INPUT_DIR = "/dev/input"
+SYSFS_INPUT_DIR = "/sys/class/input"
+DEFAULT_POLL_INTERVAL = 0.1
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+
+_WATCH_MASK = IN_ATTRIB | IN_MOVED_TO | IN_CREATE
+"""New nodes, and nodes becoming readable once udev has set their permissions"""
+
+_INOTIFY_EVENT = struct.Struct("iIII")
+"""struct inotify_event without the trailing name: wd, mask, cookie, len"""
+
+_EVENT_NODE_PREFIX = b"event"
+
+_BITS_PER_LONG = struct.calcsize("l") * 8
+"""Word size of the capability bitmaps in sysfs"""
+
+CAPABILITIES = (KEYBOARD, MOUSE, CONSUMER)
+
+_KEYBOARD_KEY_BITS = 0xFFFFFFFE
+"""KEY_ESC to KEY_S, i.e., digits and the first letter rows, as udev tests for keyboards"""
+
+_MOUSE_REL_BITS = 1 << ecodes.REL_X | 1 << ecodes.REL_Y
+
+_SYSTEM_CONTROL_KEYS = (
+    ecodes.KEY_POWER,
+    ecodes.KEY_POWER2,
+    ecodes.KEY_RESTART,
+    ecodes.KEY_SLEEP,
+    ecodes.KEY_SUSPEND,
+    ecodes.KEY_WAKEUP,
+)
+"""Power and sleep keys, e.g., of power buttons and gpio-keys, not counted as consumer keys"""
+
+_CONSUMER_KEY_BITS = sum(
+    1 << code
+    for code in get_translatable_scancodes(CONSUMER)
+    if code not in _SYSTEM_CONTROL_KEYS
+)
+
+
+class DeviceInfo:
+    """
+    Identity and capabilities of an input device node, as read from sysfs without opening it.
+
+    Capabilities are bitmaps with bit N set if the device supports event type or code N.
+    """
+
+    __slots__ = [
+        "_path",
+        "_name",
+        "_uniq",
+        "_phys",
+        "_ev_bits",
+        "_key_bits",
+        "_rel_bits",
+    ]
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        uniq: str = "",
+        phys: str = "",
+        ev_bits: int = 0,
+        key_bits: int = 0,
+        rel_bits: int = 0,
+    ) -> None:
+        self._path = path
+        self._name = name
+        self._uniq = uniq
+        self._phys = phys
+        self._ev_bits = ev_bits
+        self._key_bits = key_bits
+        self._rel_bits = rel_bits
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def uniq(self) -> str:
+        return self._uniq
+
+    @property
+    def phys(self) -> str:
+        return self._phys
+
+    @property
+    def ev_bits(self) -> int:
+        return self._ev_bits
+
+    @property
+    def key_bits(self) -> int:
+        return self._key_bits
+
+    @property
+    def rel_bits(self) -> int:
+        return self._rel_bits
+
+    def is_keyboard(self) -> bool:
+        return self._key_bits & _KEYBOARD_KEY_BITS == _KEYBOARD_KEY_BITS
+
+    def is_mouse(self) -> bool:
+        return self._rel_bits & _MOUSE_REL_BITS == _MOUSE_REL_BITS
+
+    def has_consumer_keys(self) -> bool:
+        return bool(self._key_bits & _CONSUMER_KEY_BITS)
+
+    def has_capability(self, capability: str) -> bool:
+        """
+        Tests for one of CAPABILITIES: letter keys, REL_X and REL_Y, or keys translating to
+        the consumer control gadget other than power, sleep and wakeup.
+        """
+        if capability == KEYBOARD:
+            return self.is_keyboard()
+        if capability == MOUSE:
+            return self.is_mouse()
+        if capability == CONSUMER:
+            return self.has_consumer_keys()
+        raise ValueError(f"Unknown capability: {capability}")
+
+    def __str__(self) -> str:
+        return f"device {self._path}, name {self._name!r}, phys {self._phys!r}"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._path!r}, {self._name!r})"
+
+
+class DeviceInfoCache:
+    """
+    Enumerates input devices through sysfs. Entries are cached by path together with device
+    number and inode of the node, so a node is only read once until it is recreated, and there
+    is at most one entry per node name. Nodes without sysfs entry are opened briefly instead.
+    """
+
+    def __init__(
+        self, input_dir: str = INPUT_DIR, sysfs_dir: str = SYSFS_INPUT_DIR
+    ) -> None:
+        self._input_dir = input_dir
+        self._sysfs_dir = sysfs_dir
+        self._cache: dict[str, tuple[tuple[int, int], DeviceInfo]] = {}
+        """Device number and inode of the node, and its info, by path"""
+
+    def get(self, path: str) -> Optional[DeviceInfo]:
+        """
+        Returns the info of the node at path, or None if it does not exist (anymore).
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._cache.pop(path, None)
+            return None
+        key = (stat.st_rdev, stat.st_ino)
+        entry = self._cache.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        info = self._read(path)
+        if info is None:
+            self._cache.pop(path, None)
+            return None
+        self._cache[path] = key, info
+        return info
+
+    def list(self) -> list[DeviceInfo]:
+        """
+        Returns the infos of all readable event nodes and drops cache entries of removed nodes.
+        """
+        paths = list_devices(self._input_dir)
+        infos = [info for info in map(self.get, paths) if info]
+        if len(self._cache) > len(infos):
+            current = set(paths)
+            self._cache = {k: v for k, v in self._cache.items() if k in current}
+        return infos
+
+    def _read(self, path: str) -> Optional[DeviceInfo]:
+        device_dir = os.path.join(self._sysfs_dir, os.path.basename(path), "device")
+        try:
+            return DeviceInfo(
+                path,
+                _read_sysfs(device_dir, "name"),
+                _read_sysfs(device_dir, "uniq"),
+                _read_sysfs(device_dir, "phys"),
+                _read_bitmap(device_dir, "capabilities/ev"),
+                _read_bitmap(device_dir, "capabilities/key"),
+                _read_bitmap(device_dir, "capabilities/rel"),
+            )
+        except (OSError, ValueError) as ex:
+            _logger.debug(f"No sysfs entry for {path}, opening it instead [{ex!r}]")
+        return _read_device(path)
+
+
+def _read_sysfs(device_dir: str, attribute: str) -> str:
+    with open(os.path.join(device_dir, attribute), encoding="utf-8") as file:
+        return file.read().strip()
+
+
+def _read_bitmap(device_dir: str, attribute: str) -> int:
+    bitmap = 0
+    for word in _read_sysfs(device_dir, attribute).split():
+        bitmap = bitmap << _BITS_PER_LONG | int(word, 16)
+    return bitmap
+
+
+def _read_device(path: str) -> Optional[DeviceInfo]:
+    try:
+        device = InputDevice(path)
+    except OSError as ex:
+        _logger.debug(f"Cannot open {path} [{ex!r}]")
+        return None
+    try:
+        capabilities = device.capabilities(absinfo=False)
+        bitmaps = {
+            event_type: sum(1 << code for code in codes)
+            for event_type, codes in capabilities.items()
+        }
+        return DeviceInfo(
+            path,
+            device.name,
+            device.uniq,
+            device.phys,
+            sum(1 << event_type for event_type in capabilities),
+            bitmaps.get(ecodes.EV_KEY, 0),
+            bitmaps.get(ecodes.EV_REL, 0),
+        )
+    finally:
+        device.close()
+
+
+class InputDeviceWatcher:
+    """
+    Reports input device nodes that may have become available for relaying.
+
+    /dev/input is watched with inotify, so nodes are probed right when they appear or udev
+    changes their permissions, and nothing runs while no device changes. If inotify is not
+    available, all nodes are listed every `poll_interval` seconds instead.
+    """
+
+    def __init__(
+        self, input_dir: str = INPUT_DIR, poll_interval: float = DEFAULT_POLL_INTERVAL
+    ) -> None:
+        self._input_dir = input_dir
+        self._poll_interval = poll_interval
+        self._changed = asyncio.Event()
+        self._rescan = False
+
+    @property
+    def input_dir(self) -> str:
+        return self._input_dir
+
+    def rescan(self) -> None:
+        """
+        Reports all existing nodes again on the next iteration, e.g., after a relay stopped.
+        """
+        self._rescan = True
+        self._changed.set()
+
+    async def async_changed_paths(self) -> AsyncGenerator[list[str], None]:
+        """
+        Yields all existing event nodes first, then the nodes that changed since.
+        """
+        # Watch before listing, so no node created in between is missed
+        fd = self._open_inotify()
+        if fd is None:
+            while True:
+                yield list_devices(self._input_dir)
+                await asyncio.sleep(self._poll_interval)
+        loop = asyncio.get_running_loop()
+        loop.add_reader(fd, self._changed.set)
+        try:
+            yield list_devices(self._input_dir)
+            while True:
+                await self._changed.wait()
+                self._changed.clear()
+                paths = self._read_inotify(fd)
+                if self._rescan:
+                    self._rescan = False
+                    paths = list_devices(self._input_dir)
+                if paths:
+                    yield paths
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+    def _open_inotify(self) -> Optional[int]:
+        try:
+            fd = _inotify_init()
+        except OSError as ex:
+            _logger.warning(
+                f"inotify not available, polling {self._input_dir} instead [{ex!r}]"
+            )
+            return None
+        try:
+            _inotify_add_watch(fd, self._input_dir, _WATCH_MASK)
+        except OSError as ex:
+            os.close(fd)
+            _logger.warning(f"Cannot watch {self._input_dir}, polling instead [{ex!r}]")
+            return None
+        _logger.debug(f"Watching {self._input_dir} for input devices")
+        return fd
+
+    def _read_inotify(self, fd: int) -> list[str]:
+        paths: dict[str, None] = {}
+        while True:
+            try:
+                buffer = os.read(fd, 4096)
+            except BlockingIOError:
+                return list(paths)
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += _INOTIFY_EVENT.size
+                name = buffer[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self._rescan = True
+                elif name.startswith(_EVENT_NODE_PREFIX):
+                    paths[os.path.join(self._input_dir, os.fsdecode(name))] = None
+
+
+def _inotify_init() -> int:
+    try:
+        inotify_init1 = get_libc().inotify_init1
+    except AttributeError:
+        raise OSError("libc has no inotify support")
+    fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return fd
+
+
+def _inotify_add_watch(fd: int, path: str, mask: int) -> int:
+    wd = get_libc().inotify_add_watch(fd, os.fsencode(path), ctypes.c_uint32(mask))
+    if wd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), path)
+    return wd
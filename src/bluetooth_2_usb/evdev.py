@@ -1,4 +1,4 @@
-from functools import lru_cache
+from typing import NamedTuple
 
 from adafruit_hid.consumer_control_code import ConsumerControlCode
 from adafruit_hid.keycode import Keycode, MouseButton
@@ -1040,6 +1040,15 @@ class ecodes:
     SND_CNT = SND_MAX + 1
 
 
+class ExtendedMouseButton(MouseButton):
+    """adafruit_hid's mouse buttons plus the two side buttons of the 5-button mouse report"""
+
+    BACK = 0x08
+    """Back (side) mouse button."""
+    FORWARD = 0x10
+    """Forward (extra) mouse button."""
+
+
 _EVDEV_TO_USB_HID: dict[int, int] = {
     ecodes.KEY_A: Keycode.A,
     ecodes.KEY_B: Keycode.B,
@@ -1165,6 +1174,8 @@ _EVDEV_TO_USB_HID: dict[int, int] = {
     ecodes.BTN_LEFT: MouseButton.LEFT,
     ecodes.BTN_RIGHT: MouseButton.RIGHT,
     ecodes.BTN_MIDDLE: MouseButton.MIDDLE,
+    ecodes.BTN_SIDE: ExtendedMouseButton.BACK,
+    ecodes.BTN_EXTRA: ExtendedMouseButton.FORWARD,
     # Mapping from evdev ecodes to HID UsageIDs from consumer page (0x0C): https://github.com/torvalds/linux/blob/11d3f72613957cba0783938a1ceddffe7dbbf5a1/drivers/hid/hid-input.c#L1069
     ecodes.KEY_POWER: ConsumerControlCode.POWER,
     ecodes.KEY_RESTART: ConsumerControlCode.RESET,
@@ -1468,71 +1479,140 @@ _MOUSE_BUTTONS = set(
         ecodes.BTN_LEFT,
         ecodes.BTN_RIGHT,
         ecodes.BTN_MIDDLE,
+        ecodes.BTN_SIDE,
+        ecodes.BTN_EXTRA,
     )
 )
 """Mouse button ecodes"""
 
 
+KEYBOARD = "keyboard"
+MOUSE = "mouse"
+CONSUMER = "consumer"
+
+
+class HidMapping(NamedTuple):
+    """Translation of an evdev scancode to a HID UsageID of one of the USB gadgets"""
+
+    hid_usage_id: int | None
+    key_name: str | None
+    usage_name: str | None
+    gadget: str
+
+
+def _build_key_names() -> list[str | None]:
+    key_names: list[str | None] = [None] * ecodes.KEY_CNT
+    for attribute in dir(ecodes):
+        if not attribute.startswith(("KEY_", "BTN_")):
+            continue
+        scancode = getattr(ecodes, attribute)
+        if scancode < ecodes.KEY_CNT and key_names[scancode] is None:
+            key_names[scancode] = attribute
+    return key_names
+
+
+def _build_usage_names(code_type: type) -> dict[int, str]:
+    usage_names: dict[int, str] = {}
+    for attribute in dir(code_type):
+        hid_usage_id = getattr(code_type, attribute)
+        if isinstance(hid_usage_id, int):
+            usage_names.setdefault(hid_usage_id, attribute)
+    return usage_names
+
+
+def _build_scancode_table() -> list[HidMapping | None]:
+    table: list[HidMapping | None] = [None] * ecodes.KEY_CNT
+    for scancode in _EVDEV_TO_USB_HID.keys() | _CONSUMER_KEYS | _MOUSE_BUTTONS:
+        if scancode in _CONSUMER_KEYS:
+            gadget = CONSUMER
+        elif scancode in _MOUSE_BUTTONS:
+            gadget = MOUSE
+        else:
+            gadget = KEYBOARD
+        hid_usage_id = _EVDEV_TO_USB_HID.get(scancode, None)
+        table[scancode] = HidMapping(
+            hid_usage_id,
+            _KEY_NAMES[scancode],
+            _USAGE_NAMES[gadget].get(hid_usage_id),  # type: ignore
+            gadget,
+        )
+    return table
+
+
+_KEY_NAMES = _build_key_names()
+"""evdev key names indexed by scancode"""
+
+_USAGE_NAMES = {
+    KEYBOARD: _build_usage_names(Keycode),
+    MOUSE: _build_usage_names(ExtendedMouseButton),
+    CONSUMER: _build_usage_names(ConsumerControlCode),
+}
+"""HID usage names by UsageID for each gadget"""
+
+_SCANCODE_TABLE = _build_scancode_table()
+"""HID mappings indexed by scancode, precompiled at import time"""
+
+
+def get_hid_mapping(scancode: int) -> HidMapping | None:
+    if 0 <= scancode < ecodes.KEY_CNT:
+        return _SCANCODE_TABLE[scancode]
+    return None
+
+
+def get_translatable_scancodes(gadget: str | None = None) -> list[int]:
+    """
+    Returns the scancodes that have a HID UsageID on the given gadget, or on any gadget.
+    """
+    return [
+        scancode
+        for scancode, mapping in enumerate(_SCANCODE_TABLE)
+        if mapping is not None
+        and mapping.hid_usage_id is not None
+        and gadget in (None, mapping.gadget)
+    ]
+
+
 def evdev_to_usb_hid(event: KeyEvent) -> tuple[int | None, str | None]:
     scancode: int = event.scancode
-    key_name = find_key_name(event)
-    hid_usage_id = _EVDEV_TO_USB_HID.get(scancode, None)
-    hid_usage_name = find_usage_name(event, hid_usage_id)
+    mapping = get_hid_mapping(scancode)
+    if mapping is None:
+        _logger.warning("Unsupported key pressed: 0x%02X", scancode)
+        return None, None
+    hid_usage_id, key_name, hid_usage_name, _ = mapping
     if any(item is None for item in (key_name, hid_usage_id, hid_usage_name)):
-        _logger.warning(f"Unsupported key pressed: 0x{scancode:02X}")
+        _logger.warning("Unsupported key pressed: 0x%02X", scancode)
     else:
         _logger.debug(
-            f"Converted evdev scancode 0x{scancode:02X} ({key_name}) to HID UsageID 0x{hid_usage_id:02X} ({hid_usage_name})"
+            "Converted evdev scancode 0x%02X (%s) to HID UsageID 0x%02X (%s)",
+            scancode,
+            key_name,
+            hid_usage_id,
+            hid_usage_name,
         )
     return hid_usage_id, hid_usage_name
 
 
 def find_key_name(event: KeyEvent) -> str | None:
     scancode: int = event.scancode
-    for attribute in _cached_dir(ecodes):
-        if _cached_getattr(ecodes, attribute) == scancode and attribute.startswith(
-            ("KEY_", "BTN_")
-        ):
-            return attribute
+    if 0 <= scancode < ecodes.KEY_CNT:
+        return _KEY_NAMES[scancode]
     return None
 
 
 def find_usage_name(event: KeyEvent, hid_usage_id: int | None) -> str | None:
-    code_type = _get_hid_code_type(event)
-    for attribute in _cached_dir(code_type):
-        if _cached_getattr(code_type, attribute) == hid_usage_id:
-            return attribute
-    return None
-
-
-@lru_cache(maxsize=512)
-def _cached_getattr(class_type, attribute):
-    return getattr(class_type, attribute, None)
-
-
-@lru_cache()
-def _cached_dir(
-    class_type: type,
-) -> list[str]:
-    return dir(class_type)
-
-
-def _get_hid_code_type(
-    event: KeyEvent,
-) -> type[ConsumerControlCode] | type[Keycode] | type[MouseButton]:
-    if is_consumer_key(event):
-        return ConsumerControlCode
-    elif is_mouse_button(event):
-        return MouseButton
-    return Keycode
+    mapping = get_hid_mapping(event.scancode)
+    gadget = KEYBOARD if mapping is None else mapping.gadget
+    return _USAGE_NAMES[gadget].get(hid_usage_id)  # type: ignore
 
 
 def is_mouse_button(event: KeyEvent) -> bool:
-    return event.scancode in _MOUSE_BUTTONS
+    mapping = get_hid_mapping(event.scancode)
+    return mapping is not None and mapping.gadget == MOUSE
 
 
 def is_consumer_key(event: KeyEvent) -> bool:
-    return event.scancode in _CONSUMER_KEYS
+    mapping = get_hid_mapping(event.scancode)
+    return mapping is not None and mapping.gadget == CONSUMER
 
 
 def get_mouse_movement(event: RelEvent) -> tuple[int, int, int]:
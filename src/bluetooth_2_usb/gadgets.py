@@ -0,0 +1,609 @@
+import asyncio
+from asyncio import AbstractEventLoop
+from collections import deque
+import os
+from pathlib import Path
+import struct
+import threading
+from typing import Callable, Optional
+
+import usb_hid
+from usb_hid import Device
+
+from .logging import get_logger
+
+
+_logger = get_logger()
+
+DEFAULT_QUEUE_SIZE = 64
+
+ReportMerger = Callable[[bytes, bytes], Optional[bytes]]
+"""Merges a report into a queued report of the same gadget. Returns None if they cannot be merged."""
+
+
+HI_RES_WHEEL_MULTIPLIER = 120
+"""Wheel and pan units per detent of the high-resolution mouse, same as evdev's *_HI_RES codes"""
+
+HI_RES_MOUSE_REPORT = struct.Struct("<Bhhhh")
+"""Report layout of the high-resolution mouse: buttons, X, Y, wheel and pan"""
+
+HI_RES_MOUSE = Device(
+    # fmt: off
+    descriptor=bytes(
+        (
+            0x05, 0x01,  # Usage Page (Generic Desktop Ctrls)
+            0x09, 0x02,  # Usage (Mouse)
+            0xA1, 0x01,  # Collection (Application)
+            0x85, 0x02,  #   Report ID (2)
+            0x09, 0x01,  #   Usage (Pointer)
+            0xA1, 0x00,  #   Collection (Physical)
+            0x05, 0x09,  #     Usage Page (Button)
+            0x19, 0x01,  #     Usage Minimum (0x01)
+            0x29, 0x05,  #     Usage Maximum (0x05)
+            0x15, 0x00,  #     Logical Minimum (0)
+            0x25, 0x01,  #     Logical Maximum (1)
+            0x95, 0x05,  #     Report Count (5)
+            0x75, 0x01,  #     Report Size (1)
+            0x81, 0x02,  #     Input (Data,Var,Abs)
+            0x95, 0x01,  #     Report Count (1)
+            0x75, 0x03,  #     Report Size (3)
+            0x81, 0x01,  #     Input (Const,Array,Abs)
+            0x05, 0x01,  #     Usage Page (Generic Desktop Ctrls)
+            0x09, 0x30,  #     Usage (X)
+            0x09, 0x31,  #     Usage (Y)
+            0x16, 0x01, 0x80,  # Logical Minimum (-32767)
+            0x26, 0xFF, 0x7F,  # Logical Maximum (32767)
+            0x75, 0x10,  #     Report Size (16)
+            0x95, 0x02,  #     Report Count (2)
+            0x81, 0x06,  #     Input (Data,Var,Rel)
+            0xA1, 0x02,  #     Collection (Logical)
+            0x09, 0x48,  #       Usage (Resolution Multiplier)
+            0x15, 0x00,  #       Logical Minimum (0)
+            0x25, 0x01,  #       Logical Maximum (1)
+            0x35, 0x01,  #       Physical Minimum (1)
+            0x45, HI_RES_WHEEL_MULTIPLIER,  # Physical Maximum (120)
+            0x75, 0x02,  #       Report Size (2)
+            0x95, 0x01,  #       Report Count (1)
+            0xB1, 0x02,  #       Feature (Data,Var,Abs)
+            0x09, 0x38,  #       Usage (Wheel)
+            0x16, 0x01, 0x80,  # Logical Minimum (-32767)
+            0x26, 0xFF, 0x7F,  # Logical Maximum (32767)
+            0x35, 0x00,  #       Physical Minimum (0)
+            0x45, 0x00,  #       Physical Maximum (0)
+            0x75, 0x10,  #       Report Size (16)
+            0x81, 0x06,  #       Input (Data,Var,Rel)
+            0xC0,  #           End Collection
+            0xA1, 0x02,  #     Collection (Logical)
+            0x09, 0x48,  #       Usage (Resolution Multiplier)
+            0x15, 0x00,  #       Logical Minimum (0)
+            0x25, 0x01,  #       Logical Maximum (1)
+            0x35, 0x01,  #       Physical Minimum (1)
+            0x45, HI_RES_WHEEL_MULTIPLIER,  # Physical Maximum (120)
+            0x75, 0x02,  #       Report Size (2)
+            0xB1, 0x02,  #       Feature (Data,Var,Abs)
+            0x75, 0x04,  #       Report Size (4)
+            0xB1, 0x01,  #       Feature (Const,Array,Abs)
+            0x05, 0x0C,  #       Usage Page (Consumer)
+            0x0A, 0x38, 0x02,  # Usage (AC Pan)
+            0x16, 0x01, 0x80,  # Logical Minimum (-32767)
+            0x26, 0xFF, 0x7F,  # Logical Maximum (32767)
+            0x35, 0x00,  #       Physical Minimum (0)
+            0x45, 0x00,  #       Physical Maximum (0)
+            0x75, 0x10,  #       Report Size (16)
+            0x81, 0x06,  #       Input (Data,Var,Rel)
+            0xC0,  #           End Collection
+            0xC0,  #         End Collection
+            0xC0,  #       End Collection
+        )
+    ),
+    # fmt: on
+    usage_page=0x1,
+    usage=0x02,
+    report_ids=[0x02],
+    in_report_lengths=[HI_RES_MOUSE_REPORT.size],
+    out_report_lengths=[0],
+    name="high-resolution mouse gadget",
+)
+"""
+Mouse gadget with 5 buttons, 16-bit X/Y deltas and a high-resolution wheel and horizontal pan
+axis. Hosts that support the Resolution Multiplier (e.g., Windows 8+ and Linux 5.0+) interpret
+wheel and pan in 1/120 of a detent.
+"""
+
+NKRO_BOOT_REPORT_LENGTH = 8
+"""Length of the boot keyboard compatible prefix of the NKRO report"""
+
+NKRO_BITMAP_USAGES = 0xE0
+"""Number of keyboard usages (0x00 to 0xDF) covered by the key bitmap of the NKRO report"""
+
+NKRO_KEYBOARD = Device(
+    # fmt: off
+    descriptor=bytes(
+        (
+            0x05, 0x01,  # Usage Page (Generic Desktop Ctrls)
+            0x09, 0x06,  # Usage (Keyboard)
+            0xA1, 0x01,  # Collection (Application)
+            0x05, 0x07,  #   Usage Page (Kbrd/Keypad)
+            0x19, 0xE0,  #   Usage Minimum (0xE0)
+            0x29, 0xE7,  #   Usage Maximum (0xE7)
+            0x15, 0x00,  #   Logical Minimum (0)
+            0x25, 0x01,  #   Logical Maximum (1)
+            0x75, 0x01,  #   Report Size (1)
+            0x95, 0x08,  #   Report Count (8)
+            0x81, 0x02,  #   Input (Data,Var,Abs)
+            0x75, 0x08,  #   Report Size (8)
+            0x95, 0x07,  #   Report Count (7)
+            0x81, 0x01,  #   Input (Const,Array,Abs): reserved byte and 6 boot key slots
+            0x05, 0x08,  #   Usage Page (LEDs)
+            0x19, 0x01,  #   Usage Minimum (Num Lock)
+            0x29, 0x05,  #   Usage Maximum (Kana)
+            0x75, 0x01,  #   Report Size (1)
+            0x95, 0x05,  #   Report Count (5)
+            0x91, 0x02,  #   Output (Data,Var,Abs)
+            0x75, 0x03,  #   Report Size (3)
+            0x95, 0x01,  #   Report Count (1)
+            0x91, 0x01,  #   Output (Const,Array,Abs)
+            0x05, 0x07,  #   Usage Page (Kbrd/Keypad)
+            0x19, 0x00,  #   Usage Minimum (0x00)
+            0x29, NKRO_BITMAP_USAGES - 1,  # Usage Maximum (0xDF)
+            0x75, 0x01,  #   Report Size (1)
+            0x95, NKRO_BITMAP_USAGES,  # Report Count (224)
+            0x81, 0x02,  #   Input (Data,Var,Abs)
+            0xC0,  #       End Collection
+        )
+    ),
+    # fmt: on
+    usage_page=0x1,
+    usage=0x06,
+    report_ids=[0],
+    in_report_lengths=[NKRO_BOOT_REPORT_LENGTH + NKRO_BITMAP_USAGES // 8],
+    out_report_lengths=[1],
+    name="NKRO keyboard gadget",
+)
+"""
+N-key rollover keyboard gadget. The report starts with the 8 bytes of a boot keyboard report,
+whose key slots are declared as padding, followed by a bitmap with one bit per key. Hosts
+using the report protocol read the bitmap, while BIOS and other boot protocol hosts read the
+first six pressed keys from the slots. The report has no report ID, so it is boot compatible.
+"""
+
+
+HIGH_SPEED = "high-speed"
+FULL_SPEED = "full-speed"
+
+
+class HidFunctionConfig:
+    """
+    Endpoint parameters of the HID function of a USB gadget in configfs.
+
+    The report length is the wMaxPacketSize of the interrupt IN endpoint. f_hid truncates every
+    write to it, so it never falls below the report size including the report ID byte.
+    usb_hid.enable() omits the report ID byte, thus the report length is always rewritten.
+    """
+
+    __slots__ = ["_device", "_poll_interval", "_report_length", "_boot_keyboard"]
+
+    def __init__(
+        self,
+        device: Device,
+        poll_interval: Optional[int] = None,
+        report_length: Optional[int] = None,
+        boot_keyboard: bool = False,
+    ) -> None:
+        self._device = device
+        self._poll_interval = poll_interval
+        self._report_length = max(report_length or 0, get_report_size(device))
+        self._boot_keyboard = boot_keyboard
+
+    @property
+    def device(self) -> Device:
+        return self._device
+
+    @property
+    def poll_interval(self) -> Optional[int]:
+        """Requested polling interval in ms, or None for the kernel default"""
+        return self._poll_interval
+
+    @property
+    def report_length(self) -> int:
+        return self._report_length
+
+    @property
+    def boot_keyboard(self) -> bool:
+        return self._boot_keyboard
+
+    def attributes(self, speed: str) -> dict[str, int]:
+        """
+        Returns the configfs attributes of the HID function for a UDC of the given speed.
+        """
+        attributes = {"report_length": self._report_length}
+        if self._poll_interval is not None:
+            attributes["interval"] = poll_interval_to_binterval(
+                self._poll_interval, speed
+            )
+        if self._boot_keyboard:
+            # usb_hid.enable() announces the report ID as interface protocol, i.e. "none" for
+            # gadgets without report ID. Boot protocol hosts only pick up keyboard protocol 1.
+            attributes["protocol"] = 1
+            attributes["subclass"] = 1
+        return attributes
+
+
+def get_report_size(device: Device) -> int:
+    """
+    Returns the size of the gadget's input report, including the report ID byte if any.
+    """
+    return device.in_report_lengths[0] + (1 if device.report_ids[0] else 0)
+
+
+def get_udc_speed() -> str:
+    """
+    Returns the maximum speed of the USB device controller the gadget is bound to, e.g.
+    "high-speed". Falls back to full-speed if it cannot be determined.
+    """
+    try:
+        udc = _gadget_root().joinpath("UDC").read_text(encoding="utf-8").strip()
+        return (
+            Path("/sys/class/udc", udc, "maximum_speed")
+            .read_text(encoding="utf-8")
+            .strip()
+        )
+    except OSError:
+        return FULL_SPEED
+
+
+def poll_interval_to_binterval(poll_interval: int, speed: str) -> int:
+    """
+    Converts a polling interval in ms to the bInterval of an interrupt endpoint. For full-speed
+    it is given in frames of 1 ms, else as exponent of 125 µs microframes: 2^(bInterval-1).
+    """
+    if speed in (FULL_SPEED, "low-speed"):
+        return min(max(poll_interval, 1), 255)
+    return min(max(poll_interval * 8, 1).bit_length(), 16)
+
+
+def binterval_to_poll_interval(binterval: int, speed: str) -> float:
+    """
+    Converts the bInterval of an interrupt endpoint to the polling interval in ms.
+    """
+    if speed in (FULL_SPEED, "low-speed"):
+        return binterval
+    return 2 ** (binterval - 1) / 8
+
+
+def configure_hid_functions(configs: list[HidFunctionConfig]) -> None:
+    """
+    Rebinds the USB gadget with the given parameters of its HID functions, since configfs
+    attributes can only be written while the gadget is unbound. Polling intervals are skipped
+    with a warning if the kernel's f_hid does not support them. If all attributes already have
+    their values, the gadget stays bound, so the host does not see a disconnect.
+    """
+    speed = get_udc_speed()
+    gadget_root = _gadget_root()
+    writes: list[tuple[Path, int]] = []
+    for config in configs:
+        function_root = _function_root(config.device)
+        for name, value in config.attributes(speed).items():
+            attribute = function_root / name
+            if not attribute.exists():
+                _logger.warning(
+                    f"Kernel does not support setting {name} of {config.device}. Please update your kernel."
+                )
+                continue
+            if _attribute_equals(attribute, value):
+                continue
+            writes.append((attribute, value))
+    if not writes:
+        _logger.debug("HID function parameters unchanged, keeping the gadget bound")
+        return
+    udc_file = gadget_root / "UDC"
+    udc = udc_file.read_text(encoding="utf-8").strip()
+    udc_file.write_text("\n", encoding="utf-8")
+    try:
+        for attribute, value in writes:
+            attribute.write_text(str(value), encoding="utf-8")
+    finally:
+        udc_file.write_text(udc, encoding="utf-8")
+
+
+def log_hid_functions(devices: list[Device]) -> None:
+    """
+    Logs the effective endpoint parameters of the HID functions.
+    """
+    speed = get_udc_speed()
+    for device in devices:
+        function_root = _function_root(device)
+        try:
+            report_length = _read_attribute(function_root / "report_length")
+            protocol = _read_attribute(function_root / "protocol")
+            interval_file = function_root / "interval"
+            if interval_file.exists():
+                binterval = _read_attribute(interval_file)
+                poll_interval = f"{binterval_to_poll_interval(binterval, speed):g} ms"
+                interval = f"bInterval={binterval} ({poll_interval} at {speed})"
+            else:
+                interval = "bInterval=kernel default"
+        except (OSError, ValueError) as ex:
+            _logger.warning(f"Failed reading endpoint parameters of {device} [{ex!r}]")
+            continue
+        _logger.info(
+            f"{device}: wMaxPacketSize={report_length}, {interval}, protocol={protocol}"
+        )
+
+
+def _gadget_root() -> Path:
+    return Path(usb_hid.gadget_root)  # type: ignore
+
+
+def _function_root(device: Device) -> Path:
+    return _gadget_root() / "functions" / f"hid.usb{device.report_ids[0]}"
+
+
+def _read_attribute(attribute: Path) -> int:
+    return int(attribute.read_text(encoding="utf-8").strip(), 0)
+
+
+def _attribute_equals(attribute: Path, value: int) -> bool:
+    try:
+        return _read_attribute(attribute) == value
+    except (OSError, ValueError):
+        return False
+
+
+def _report_prefix(report_id: Optional[int]) -> bytes:
+    return bytes((report_id,)) if report_id else b""
+
+
+def _signed_byte(value: int) -> int:
+    return value - 0x100 if value & 0x80 else value
+
+
+def merge_mouse_reports(queued: bytes, report: bytes) -> Optional[bytes]:
+    """
+    Merges two 4-byte mouse reports (buttons, x, y, wheel) with equal buttons, as long as the
+    summed deltas still fit into a signed byte.
+    """
+    if queued[0] != report[0]:
+        return None
+    merged = bytearray(queued)
+    for i in range(1, 4):
+        delta = _signed_byte(queued[i]) + _signed_byte(report[i])
+        if not -127 <= delta <= 127:
+            return None
+        merged[i] = delta & 0xFF
+    return bytes(merged)
+
+
+def merge_hi_res_mouse_reports(queued: bytes, report: bytes) -> Optional[bytes]:
+    """
+    Merges two high-resolution mouse reports with equal buttons, as long as the summed deltas
+    still fit into their 16-bit fields.
+    """
+    buttons, *queued_deltas = HI_RES_MOUSE_REPORT.unpack(queued)
+    report_buttons, *deltas = HI_RES_MOUSE_REPORT.unpack(report)
+    if buttons != report_buttons:
+        return None
+    merged = [a + b for a, b in zip(queued_deltas, deltas)]
+    if any(not -32767 <= delta <= 32767 for delta in merged):
+        return None
+    return HI_RES_MOUSE_REPORT.pack(buttons, *merged)
+
+
+class _QueuedHidWriter:
+    """
+    Base class of the HID report writers. Each writer owns an ordered queue of the reports that
+    the gadget could not take yet. While reports are queued, a new report may be merged into the
+    last queued one (e.g., relative mouse deltas), else it is appended.
+
+    The queue never grows beyond max_queue_size, e.g., while the host is suspended. Once it is
+    full, a report that cannot be merged replaces the last queued one. Since every report
+    carries the gadget's complete state (held keys, buttons), the host still ends up in the
+    latest state, only intermediate states are lost: keys pressed and released while the queue
+    was full, and the movement of the replaced mouse report. Producers never wait for a gadget,
+    so a stalled gadget does not hold up the others.
+
+    Reports are always sent with the gadget's own report ID. The report_id argument of
+    send_report() only exists for compatibility with usb_hid.Device.
+    """
+
+    def __init__(
+        self,
+        device: Device,
+        max_queue_size: int = DEFAULT_QUEUE_SIZE,
+        merge_reports: Optional[ReportMerger] = None,
+        prefix_length: int = 0,
+    ) -> None:
+        self._device = device
+        self._max_queue_size = max_queue_size
+        self._merge_reports = merge_reports
+        self._prefix_length = prefix_length
+        self._pending: deque[bytes] = deque()
+        self._replaced_reports = 0
+
+    @property
+    def device(self) -> Device:
+        return self._device
+
+    @property
+    def usage_page(self) -> int:
+        return self._device.usage_page
+
+    @property
+    def usage(self) -> int:
+        return self._device.usage
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def max_queue_size(self) -> int:
+        return self._max_queue_size
+
+    @property
+    def replaced_reports(self) -> int:
+        """Queued reports replaced by newer ones since the queue was full"""
+        return self._replaced_reports
+
+    def __str__(self) -> str:
+        return str(self._device)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._device!r})"
+
+    def _enqueue(self, data: bytes) -> None:
+        pending = self._pending
+        if pending and self._merge_reports is not None:
+            n = self._prefix_length
+            merged = self._merge_reports(pending[-1][n:], data[n:])
+            if merged is not None:
+                pending[-1] = data[:n] + merged
+                return
+        if len(pending) < self._max_queue_size:
+            pending.append(data)
+            return
+        if not self._replaced_reports:
+            _logger.warning(
+                f"{self} is backlogged with {len(pending)} reports, replacing the last one"
+            )
+        self._replaced_reports += 1
+        pending[-1] = data
+
+    def _on_drained(self) -> None:
+        if self._replaced_reports:
+            _logger.info(
+                f"{self} caught up, {self._replaced_reports} reports were replaced"
+            )
+            self._replaced_reports = 0
+
+
+class HidWriter(_QueuedHidWriter):
+    """
+    Writes HID reports to the /dev/hidgN node of a USB gadget straight from the event loop.
+
+    The node is opened non-blocking. While the gadget is still busy transferring the previous
+    report, new reports are queued and written once the event loop signals that the node is
+    writable again. Reports of one gadget are therefore always sent in order.
+
+    Reports written right away are assembled in a preallocated buffer behind the report ID, only
+    queued reports are copied.
+    """
+
+    def __init__(
+        self,
+        device: Device,
+        max_queue_size: int = DEFAULT_QUEUE_SIZE,
+        merge_reports: Optional[ReportMerger] = None,
+    ) -> None:
+        self._report_prefix = _report_prefix(device.report_ids[0])
+        super().__init__(
+            device, max_queue_size, merge_reports, len(self._report_prefix)
+        )
+        self._buffer = bytearray(get_report_size(device))
+        self._buffer[: len(self._report_prefix)] = self._report_prefix
+        self._report_view = memoryview(self._buffer)[len(self._report_prefix) :]
+        self._fd = os.open(device.path, os.O_WRONLY | os.O_NONBLOCK)  # type: ignore
+        self._loop: Optional[AbstractEventLoop] = None
+
+    def send_report(self, report: bytes, report_id: Optional[int] = None) -> None:
+        if self._pending:
+            self._enqueue(self._report_prefix + report)
+            return
+        if len(report) == len(self._report_view):
+            self._report_view[:] = report
+            data = self._buffer
+        else:
+            data = self._report_prefix + report
+        if not self._write(data):
+            self._enqueue(bytes(data))
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_writer(self._fd, self._flush)
+
+    def close(self) -> None:
+        if self._loop is not None:
+            self._loop.remove_writer(self._fd)
+        self._pending.clear()
+        os.close(self._fd)
+
+    def _write(self, data: bytes | bytearray) -> bool:
+        try:
+            os.write(self._fd, data)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _flush(self) -> None:
+        while self._pending:
+            try:
+                if not self._write(self._pending[0]):
+                    break
+            except OSError:
+                _logger.exception(f"Failed writing report to {self}")
+            self._pending.popleft()
+        else:
+            if self._loop is not None:
+                self._loop.remove_writer(self._fd)
+            self._on_drained()
+
+
+class ExecutorHidWriter(_QueuedHidWriter):
+    """
+    Sends HID reports through the blocking usb_hid.Device.send_report() from a dedicated worker
+    thread, so reports of one gadget are sent in order without blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        device: Device,
+        max_queue_size: int = DEFAULT_QUEUE_SIZE,
+        merge_reports: Optional[ReportMerger] = None,
+    ) -> None:
+        super().__init__(device, max_queue_size, merge_reports)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"hid_writer_{device.usage}", daemon=True
+        )
+        self._thread.start()
+
+    def send_report(self, report: bytes, report_id: Optional[int] = None) -> None:
+        with self._condition:
+            self._enqueue(bytes(report))
+            self._condition.notify()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                report = self._pending.popleft()
+                if not self._pending:
+                    self._on_drained()
+            try:
+                self._device.send_report(report)
+            except Exception:
+                _logger.exception(f"Failed writing report to {self}")
+
+
+def create_hid_writer(
+    device: Device,
+    threaded_writes: bool = False,
+    max_queue_size: int = DEFAULT_QUEUE_SIZE,
+    merge_reports: Optional[ReportMerger] = None,
+) -> HidWriter | ExecutorHidWriter:
+    if not threaded_writes:
+        try:
+            return HidWriter(device, max_queue_size, merge_reports)
+        except OSError as ex:
+            _logger.warning(
+                f"Cannot open {device} for non-blocking writes, falling back to a writer thread [{ex!r}]"
+            )
+    return ExecutorHidWriter(device, max_queue_size, merge_reports)
@@ -0,0 +1,17 @@
+import ctypes
+import ctypes.util
+from typing import Optional
+
+
+_libc: Optional[ctypes.CDLL] = None
+
+
+def get_libc() -> ctypes.CDLL:
+    """
+    Returns the C library, loaded once with errno support, for the system calls Python does
+    not wrap (e.g., inotify and mlockall).
+    """
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    return _libc
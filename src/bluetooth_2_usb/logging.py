@@ -1,21 +1,150 @@
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+from typing import Any, Optional
 
 _logger = logging.getLogger("bluetooth_2_usb")
 _formatter = logging.Formatter(
     "%(asctime)s [%(levelname)s] %(message)s", datefmt="%y-%m-%d %H:%M:%S"
 )
+_log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=10000)
+_listener: Optional[QueueListener] = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Hands log records over to the background listener, which formats and writes them off the
+    event loop. Only the message is rendered before, since its arguments may change until the
+    listener gets to it. If the queue is full, records are dropped instead of blocking the
+    caller, and their number is logged at most every `report_interval` seconds.
+    """
+
+    def __init__(self, log_queue: queue.Queue, report_interval: float = 10.0) -> None:
+        super().__init__(log_queue)
+        self.dropped_records = 0
+        """Records dropped since startup because the queue was full"""
+        self._report_interval = report_interval
+        self._reported_records = 0
+        self._reported_at = 0.0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only called for records passing the level and filters
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.created - self._reported_at >= self._report_interval:
+            self.report_dropped_records()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+    def report_dropped_records(self, timeout: Optional[float] = None) -> None:
+        """
+        Logs how many records were dropped since the last report, if any. Waits up to `timeout`
+        seconds for room in the queue, or not at all if None.
+        """
+        dropped = self.dropped_records - self._reported_records
+        if not dropped:
+            return
+        record = _logger.makeRecord(
+            _logger.name,
+            logging.WARNING,
+            "(unknown file)",
+            0,
+            f"Dropped {dropped} log records because the log queue was full",
+            None,
+            None,
+        )
+        try:
+            self.queue.put(record, timeout is not None, timeout)
+        except queue.Full:
+            return
+        self._reported_records += dropped
+        self._reported_at = record.created
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` records with the same message key pass per `interval` seconds. The key
+    is the unformatted message together with its arguments. Once a new interval starts, the
+    number of suppressed records is appended to the next record passing. DEBUG records are not
+    limited.
+    """
+
+    _MAX_KEYS = 1000
+
+    def __init__(self, interval: float = 1.0, burst: int = 5) -> None:
+        super().__init__()
+        self._interval = interval
+        self._burst = burst
+        self._windows: dict[Any, list] = {}
+        """[start, passed, suppressed] of the current interval by message key"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG:
+            return True
+        key = _message_key(record)
+        window = self._windows.get(key)
+        if window is None or record.created - window[0] >= self._interval:
+            if window is not None and window[2]:
+                record.msg = f"{record.msg} (suppressed {window[2]} similar messages)"
+            self._start_window(key, record.created)
+            return True
+        if window[1] < self._burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+    def _start_window(self, key: Any, now: float) -> None:
+        if len(self._windows) >= self._MAX_KEYS:
+            self._windows = {
+                k: w for k, w in self._windows.items() if now - w[0] < self._interval
+            }
+        self._windows[key] = [now, 1, 0]
+
+
+def _message_key(record: logging.LogRecord) -> Any:
+    key = (record.msg, record.args)
+    try:
+        hash(key)
+    except TypeError:
+        return str(record.msg)
+    return key
 
 
 def get_logger() -> logging.Logger:
+    global _listener
     if not _logger.handlers:
         _logger.setLevel(logging.INFO)
         stdout_handler = logging.StreamHandler()
         stdout_handler.setFormatter(_formatter)
-        _logger.addHandler(stdout_handler)
+        queue_handler = _DeferredQueueHandler(_log_queue)
+        queue_handler.addFilter(RateLimitFilter())
+        _logger.addHandler(queue_handler)
+        _listener = QueueListener(_log_queue, stdout_handler)
+        _listener.start()
+        atexit.register(_stop_listener, queue_handler)
     return _logger
 
 
+def _stop_listener(queue_handler: _DeferredQueueHandler) -> None:
+    # While the listener still runs, so the report gets through even if the queue was full
+    queue_handler.report_dropped_records(timeout=1.0)
+    if _listener is not None:
+        _listener.stop()
+
+
 def add_file_handler(log_path: str) -> None:
     file_handler = logging.FileHandler(log_path)
     file_handler.setFormatter(_formatter)
-    get_logger().addHandler(file_handler)
+    get_logger()
+    if _listener is not None:
+        _listener.handlers = (*_listener.handlers, file_handler)
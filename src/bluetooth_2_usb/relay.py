@@ -1,61 +1,194 @@
 import asyncio
-from asyncio import CancelledError, TaskGroup
+from asyncio import CancelledError, Task, TaskGroup
+import ctypes
+import errno
+import fcntl
+import fnmatch
+from logging import DEBUG
+import os
 import re
-from typing import AsyncGenerator, NoReturn, Optional
+import select
+import struct
+import time
+from typing import AsyncGenerator, Callable, NoReturn, Optional
 
+from adafruit_hid import find_device
 from adafruit_hid.consumer_control import ConsumerControl
-from adafruit_hid.keyboard import Keyboard
+from adafruit_hid.keycode import Keycode
 from adafruit_hid.mouse import Mouse
-from evdev import InputDevice, InputEvent, KeyEvent, RelEvent, categorize, list_devices
+from evdev import InputDevice, InputEvent, KeyEvent, categorize
 import usb_hid
 from usb_hid import Device
 
+from .discovery import DeviceInfo, DeviceInfoCache, InputDeviceWatcher
 from .evdev import (
-    evdev_to_usb_hid,
-    get_mouse_movement,
-    is_consumer_key,
-    is_mouse_button,
+    CONSUMER,
+    KEYBOARD,
+    MOUSE,
+    HidMapping,
+    ecodes,
+    get_hid_mapping,
+    get_translatable_scancodes,
+)
+from .gadgets import (
+    HI_RES_MOUSE,
+    HI_RES_MOUSE_REPORT,
+    HI_RES_WHEEL_MULTIPLIER,
+    NKRO_BITMAP_USAGES,
+    NKRO_BOOT_REPORT_LENGTH,
+    NKRO_KEYBOARD,
+    ExecutorHidWriter,
+    HidFunctionConfig,
+    HidWriter,
+    configure_hid_functions,
+    create_hid_writer,
+    merge_hi_res_mouse_reports,
+    log_hid_functions,
+    merge_mouse_reports,
 )
 from .logging import get_logger
+from .tuning import IdleCollector, freeze_gc
 
 
 _logger = get_logger()
-_keyboard_gadget: Optional[Keyboard] = None
-_mouse_gadget: Optional[Mouse] = None
+_keyboard_gadget: Optional["KeyboardReport"] = None
+_mouse_gadget: Optional["Mouse | HiResMouseReport"] = None
 _consumer_gadget: Optional[ConsumerControl] = None
+_writers: list[HidWriter | ExecutorHidWriter] = []
+_idle_collector: Optional[IdleCollector] = None
+_device_infos = DeviceInfoCache()
+
+INPUT_EVENT = struct.Struct("llHHi")
+"""struct input_event in native layout: sec, usec, type, code, value"""
+
+RawEvent = tuple[int, int, int, int, int]
+"""An unpacked INPUT_EVENT"""
+
+EVIOCSMASK = 0x40104593
+"""_IOW('E', 0x93, struct input_mask)"""
+
+INPUT_MASK = struct.Struct("IIQ")
+"""struct input_mask: type, codes_size, codes_ptr"""
+
+_ULONG = struct.Struct("L")
+_BITS_PER_LONG = _ULONG.size * 8
+_CODE_COUNTS = {
+    ecodes.EV_SYN: ecodes.EV_CNT,
+    ecodes.EV_KEY: ecodes.KEY_CNT,
+    ecodes.EV_REL: ecodes.REL_CNT,
+}
+"""Number of codes by event type, EV_SYN standing for the event types"""
+
+MOUSE_MOVEMENT_CODES = (ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL)
+HI_RES_MOUSE_MOVEMENT_CODES = MOUSE_MOVEMENT_CODES + (
+    ecodes.REL_HWHEEL,
+    ecodes.REL_WHEEL_HI_RES,
+    ecodes.REL_HWHEEL_HI_RES,
+)
+"""Relative axes MouseFrame translates, without and with the high-resolution mouse"""
 
 PATH = "path"
 MAC = "MAC"
 NAME = "name"
+GLOB = "glob"
+REGEX = "regex"
 PATH_REGEX = r"^\/dev\/input\/event.*$"
 MAC_REGEX = r"^([0-9a-fA-F]{2}[:-]){5}([0-9a-fA-F]{2})$"
+GLOB_PREFIX = "glob:"
+REGEX_PREFIX = "re:"
+_PATH_PATTERN = re.compile(PATH_REGEX)
+_MAC_PATTERN = re.compile(MAC_REGEX)
+_USB_INTERFACE_PHYS_REGEX = r"^(usb-.+)/input\d+$"
 
 
-async def async_list_input_devices() -> list[InputDevice]:
+async def async_list_input_devices() -> list[DeviceInfo]:
     devices = []
     try:
-        devices = [InputDevice(path) for path in list_devices()]
+        devices = _device_infos.list()
     except Exception:
         _logger.exception("Failed listing devices")
         await asyncio.sleep(1)
     return devices
 
 
-def init_usb_gadgets() -> None:
+def get_device_infos(paths: list[str]) -> list[DeviceInfo]:
+    """
+    Returns the cached infos of the input devices at the given paths, skipping removed nodes.
+    """
+    return [info for info in map(_device_infos.get, paths) if info is not None]
+
+
+def init_usb_gadgets(
+    threaded_writes: bool = False,
+    hi_res_mouse: bool = False,
+    nkro_keyboard: bool = False,
+    poll_intervals: Optional[dict[str, int]] = None,
+    max_packet_sizes: Optional[dict[str, int]] = None,
+) -> None:
     _logger.debug("Initializing USB gadgets...")
-    usb_hid.enable(
-        [
-            Device.MOUSE,
-            Device.KEYBOARD,
-            Device.CONSUMER_CONTROL,
-        ]  # type: ignore
-    )
-    global _keyboard_gadget, _mouse_gadget, _consumer_gadget
+    gadget_devices = {
+        MOUSE: HI_RES_MOUSE if hi_res_mouse else Device.MOUSE,
+        KEYBOARD: NKRO_KEYBOARD if nkro_keyboard else Device.KEYBOARD,
+        CONSUMER: Device.CONSUMER_CONTROL,
+    }
+    usb_hid.enable(list(gadget_devices.values()))  # type: ignore
+    poll_intervals = poll_intervals or {}
+    max_packet_sizes = max_packet_sizes or {}
+    function_configs = [
+        HidFunctionConfig(
+            device,
+            poll_intervals.get(gadget, None),
+            max_packet_sizes.get(gadget, None),
+            boot_keyboard=gadget == KEYBOARD,
+        )
+        for gadget, device in gadget_devices.items()
+    ]
+    try:
+        configure_hid_functions(function_configs)
+    except OSError as ex:
+        _logger.warning(f"Failed configuring USB gadget endpoints [{ex!r}]")
+    log_hid_functions(list(gadget_devices.values()))
+    global _keyboard_gadget, _mouse_gadget, _consumer_gadget, _writers
     enabled_devices: list[Device] = list(usb_hid.devices)  # type: ignore
-    _keyboard_gadget = Keyboard(enabled_devices)
-    _mouse_gadget = Mouse(enabled_devices)
-    _consumer_gadget = ConsumerControl(enabled_devices)
+    report_mergers = {
+        Device.MOUSE: merge_mouse_reports,
+        HI_RES_MOUSE: merge_hi_res_mouse_reports,
+    }
+    _writers = [
+        create_hid_writer(
+            dev, threaded_writes, merge_reports=report_mergers.get(dev, None)
+        )
+        for dev in enabled_devices
+    ]
+    keyboard_writer = find_device(_writers, usage_page=0x1, usage=0x06)
+    if nkro_keyboard:
+        _keyboard_gadget = NkroKeyboardReport(keyboard_writer)
+    else:
+        _keyboard_gadget = KeyboardReport(keyboard_writer)
+    if hi_res_mouse:
+        _mouse_gadget = HiResMouseReport(
+            find_device(_writers, usage_page=0x1, usage=0x02)
+        )
+    else:
+        _mouse_gadget = Mouse(_writers)
+    _consumer_gadget = ConsumerControl(_writers)
     _logger.debug(f"Enabled USB gadgets: {enabled_devices}")
+    _logger.debug(f"HID report writers: {_writers}")
+
+
+def close_usb_gadgets() -> None:
+    """
+    Closes the report writers of the USB gadgets, e.g., on shutdown. Reports still queued are
+    discarded.
+    """
+    global _keyboard_gadget, _mouse_gadget, _consumer_gadget, _writers
+    for writer in _writers:
+        try:
+            writer.close()
+        except OSError as ex:
+            _logger.warning(f"Failed closing {writer} [{ex!r}]")
+    _writers = []
+    _keyboard_gadget = _mouse_gadget = _consumer_gadget = None
 
 
 def all_gadgets_ready() -> bool:
@@ -64,11 +197,32 @@ def all_gadgets_ready() -> bool:
     )
 
 
+def mouse_is_hi_res() -> bool:
+    return isinstance(_mouse_gadget, HiResMouseReport)
+
+
+def get_queue_depths() -> dict[str, int]:
+    """
+    Returns the number of reports waiting to be written for each USB gadget.
+    """
+    return {str(writer): writer.queue_depth for writer in _writers}
+
+
 class DeviceIdentifier:
+    """
+    Identifies input devices by path, MAC address or case-insensitive name substring.
+
+    Values starting with "glob:" are globs, matched against the whole path if the glob starts
+    with "/", else against the whole name. Values starting with "re:" are regular expressions,
+    searched for in the name. Both are case-insensitive for names. Without a prefix, *, ? and [
+    are matched literally like any other name substring.
+    """
+
     def __init__(self, device_identifier: str) -> None:
         self._value = device_identifier
         self._type = self._determine_identifier_type()
         self._normalized_value = self._normalize_identifier()
+        self._pattern = self._compile_pattern()
 
     @property
     def value(self) -> str:
@@ -88,39 +242,492 @@ class DeviceIdentifier:
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.value})"
 
+    @property
+    def pattern(self) -> Optional[re.Pattern]:
+        """
+        Compiled pattern of glob and regex identifiers, else None.
+        """
+        return self._pattern
+
+    @property
+    def matches_path(self) -> bool:
+        return self.type == PATH or (
+            self.type == GLOB and self.value.startswith(GLOB_PREFIX + "/")
+        )
+
     def _determine_identifier_type(self) -> str:
-        if re.match(PATH_REGEX, self.value):
+        if self.value.startswith(REGEX_PREFIX):
+            return REGEX
+        if self.value.startswith(GLOB_PREFIX):
+            return GLOB
+        if _PATH_PATTERN.match(self.value):
             return PATH
-        if re.match(MAC_REGEX, self.value):
+        if _MAC_PATTERN.match(self.value):
             return MAC
         return NAME
 
     def _normalize_identifier(self) -> str:
-        if self.type == PATH:
+        if self.type in (PATH, REGEX):
             return self.value
         if self.type == MAC:
             return self.value.lower().replace("-", ":")
+        if self.type == GLOB:
+            glob = self.value[len(GLOB_PREFIX) :]
+            return glob if self.matches_path else glob.lower()
         return self.value.lower()
 
-    def matches(self, device: InputDevice) -> bool:
+    def _compile_pattern(self) -> Optional[re.Pattern]:
+        if self.type == REGEX:
+            try:
+                return re.compile(self.value[len(REGEX_PREFIX) :], re.IGNORECASE)
+            except re.error as ex:
+                raise ValueError(f"Invalid regex identifier '{self.value}': {ex}")
+        if self.type == GLOB:
+            flags = 0 if self.matches_path else re.IGNORECASE
+            return re.compile(fnmatch.translate(self.normalized_value), flags)
+        return None
+
+    def matches(self, device: InputDevice | DeviceInfo) -> bool:
         if self.type == PATH:
             return self.value == device.path
         if self.type == MAC:
-            return self.normalized_value == device.uniq
+            return self.normalized_value == device.uniq.lower()
+        if self.type == GLOB:
+            target = device.path if self.matches_path else device.name
+            return self._pattern.match(target) is not None  # type: ignore
+        if self.type == REGEX:
+            return self._pattern.search(device.name) is not None  # type: ignore
         return self.normalized_value in device.name.lower()
 
 
+class DeviceIdentifierIndex:
+    """
+    Matches devices against any number of identifiers at once, instead of testing them one by
+    one: paths and MAC addresses are looked up in dicts, while name substrings, name globs and
+    path globs are each compiled into a single alternation. Regex identifiers are searched one
+    by one, since arbitrary regexes cannot be merged safely (e.g., group references).
+    """
+
+    __slots__ = [
+        "_identifiers",
+        "_paths",
+        "_macs",
+        "_name_pattern",
+        "_path_pattern",
+        "_regexes",
+    ]
+
+    def __init__(self, identifiers: list[DeviceIdentifier]) -> None:
+        self._identifiers = identifiers
+        self._paths = {id.value: id for id in identifiers if id.type == PATH}
+        self._macs = {id.normalized_value: id for id in identifiers if id.type == MAC}
+        name_parts = [
+            re.escape(id.normalized_value) for id in identifiers if id.type == NAME
+        ]
+        name_parts += [
+            rf"\A{id.pattern.pattern}"  # type: ignore
+            for id in identifiers
+            if id.type == GLOB and not id.matches_path
+        ]
+        path_parts = [
+            id.pattern.pattern  # type: ignore
+            for id in identifiers
+            if id.type == GLOB and id.matches_path
+        ]
+        self._name_pattern = _compile_alternation(name_parts, re.IGNORECASE)
+        self._path_pattern = _compile_alternation(path_parts)
+        self._regexes = [id.pattern for id in identifiers if id.type == REGEX]
+
+    @property
+    def identifiers(self) -> list[DeviceIdentifier]:
+        return self._identifiers
+
+    def __bool__(self) -> bool:
+        return bool(self._identifiers)
+
+    def __str__(self) -> str:
+        return " or ".join(str(id) for id in self._identifiers)
+
+    def matches(self, device: InputDevice | DeviceInfo) -> bool:
+        if device.path in self._paths:
+            return True
+        if device.uniq and device.uniq.lower() in self._macs:
+            return True
+        if self._name_pattern and self._name_pattern.search(device.name):
+            return True
+        if self._path_pattern and self._path_pattern.match(device.path):
+            return True
+        return any(regex.search(device.name) for regex in self._regexes)  # type: ignore
+
+
+def _compile_alternation(parts: list[str], flags: int = 0) -> Optional[re.Pattern]:
+    if not parts:
+        return None
+    return re.compile("|".join(f"(?:{part})" for part in parts), flags)
+
+
+class MouseFrame:
+    """
+    Accumulates relative mouse movement and button changes of a single SYN_REPORT frame.
+
+    With hi_res=True, wheel and horizontal wheel are reported in 1/120 of a detent. Devices
+    emitting REL_WHEEL_HI_RES / REL_HWHEEL_HI_RES also emit the legacy detent codes, so the
+    detents are only used for frames without high-resolution values.
+    """
+
+    __slots__ = [
+        "_hi_res",
+        "_x",
+        "_y",
+        "_mwheel",
+        "_hwheel",
+        "_mwheel_hi_res",
+        "_hwheel_hi_res",
+        "_pressed",
+        "_released",
+    ]
+
+    def __init__(self, hi_res: bool = False) -> None:
+        self._hi_res = hi_res
+        self._x = 0
+        self._y = 0
+        self._mwheel = 0
+        self._hwheel = 0
+        self._mwheel_hi_res = 0
+        self._hwheel_hi_res = 0
+        self._pressed = 0
+        self._released = 0
+
+    @property
+    def pending(self) -> bool:
+        return any(
+            (
+                self._x,
+                self._y,
+                self._mwheel,
+                self._hwheel,
+                self._mwheel_hi_res,
+                self._hwheel_hi_res,
+                self._pressed,
+                self._released,
+            )
+        )
+
+    def add_movement(self, code: int, value: int) -> None:
+        if code == ecodes.REL_X:
+            self._x += value
+        elif code == ecodes.REL_Y:
+            self._y += value
+        elif code == ecodes.REL_WHEEL:
+            self._mwheel += value
+        elif not self._hi_res:
+            return
+        elif code == ecodes.REL_HWHEEL:
+            self._hwheel += value
+        elif code == ecodes.REL_WHEEL_HI_RES:
+            self._mwheel_hi_res += value
+        elif code == ecodes.REL_HWHEEL_HI_RES:
+            self._hwheel_hi_res += value
+
+    def add_button(self, button: int, keystate: int) -> None:
+        if keystate == KeyEvent.key_down:
+            self._pressed |= button
+            self._released &= ~button
+        elif keystate == KeyEvent.key_up:
+            self._released |= button
+            self._pressed &= ~button
+
+    def flush(self, move: Callable[[int, int, int, int, int, int], None]) -> None:
+        """
+        Passes x, y, mwheel, hwheel, pressed and released of the frame to `move` and starts a new
+        frame.
+        """
+        mwheel, hwheel = self._mwheel, self._hwheel
+        if self._hi_res:
+            mwheel = self._mwheel_hi_res or mwheel * HI_RES_WHEEL_MULTIPLIER
+            hwheel = self._hwheel_hi_res or hwheel * HI_RES_WHEEL_MULTIPLIER
+        x, y, pressed, released = self._x, self._y, self._pressed, self._released
+        self.clear()
+        move(x, y, mwheel, hwheel, pressed, released)
+
+    def clear(self) -> None:
+        """
+        Discards the frame.
+        """
+        self._x = self._y = self._mwheel = self._hwheel = 0
+        self._mwheel_hi_res = self._hwheel_hi_res = 0
+        self._pressed = self._released = 0
+
+
+class KeyboardReport:
+    """
+    State engine of the keyboard gadget.
+
+    Key changes only update a preallocated 8-byte report (modifier bits, reserved byte and six
+    key slots). The report is written by send() once per SYN_REPORT frame, and only if the
+    frame actually changed it. This way, modifier plus key, rollover or chords reach the host
+    as a single report.
+    """
+
+    __slots__ = ["_writer", "_report", "_keys", "_changed"]
+
+    _REPORT_LENGTH = 8
+
+    def __init__(self, writer) -> None:
+        self._writer = writer
+        self._report = bytearray(self._REPORT_LENGTH)
+        self._keys = memoryview(self._report)[2:8]
+        self._changed = False
+
+    def __str__(self) -> str:
+        return str(self._writer)
+
+    @property
+    def report(self) -> bytearray:
+        return self._report
+
+    def press(self, keycode: int) -> None:
+        modifier = Keycode.modifier_bit(keycode)
+        if modifier:
+            self._set_modifiers(self._report[0] | modifier)
+            return
+        keys = self._keys
+        if keycode in keys:
+            return
+        for i in range(len(keys)):
+            if not keys[i]:
+                keys[i] = keycode
+                break
+        else:
+            # All slots taken: drop the oldest key, like adafruit_hid's Keyboard does
+            self._report[2:7] = self._report[3:8]
+            keys[-1] = keycode
+        self._changed = True
+
+    def release(self, keycode: int) -> None:
+        modifier = Keycode.modifier_bit(keycode)
+        if modifier:
+            self._set_modifiers(self._report[0] & ~modifier)
+            return
+        keys = self._keys
+        if keycode not in keys:
+            return
+        j = 0
+        for i in range(len(keys)):
+            if keys[i] and keys[i] != keycode:
+                keys[j] = keys[i]
+                j += 1
+        for i in range(j, len(keys)):
+            keys[i] = 0
+        self._changed = True
+
+    def send(self) -> None:
+        if self._changed:
+            self._changed = False
+            self._writer.send_report(self._report)
+
+    def _set_modifiers(self, modifiers: int) -> None:
+        if modifiers != self._report[0]:
+            self._report[0] = modifiers
+            self._changed = True
+
+
+class NkroKeyboardReport(KeyboardReport):
+    """
+    State engine of the NKRO keyboard gadget (see gadgets.NKRO_KEYBOARD).
+
+    Each key is a single bit in the key bitmap following the 8 boot report bytes, so any
+    number of keys can be pressed at once. The first six pressed keys are additionally kept
+    in the boot key slots for hosts using the boot protocol.
+    """
+
+    __slots__ = []
+
+    _REPORT_LENGTH = NKRO_BOOT_REPORT_LENGTH + NKRO_BITMAP_USAGES // 8
+
+    def press(self, keycode: int) -> None:
+        super().press(keycode)
+        if keycode < NKRO_BITMAP_USAGES:
+            index = NKRO_BOOT_REPORT_LENGTH + (keycode >> 3)
+            bit = 1 << (keycode & 7)
+            if not self._report[index] & bit:
+                self._report[index] |= bit
+                self._changed = True
+
+    def release(self, keycode: int) -> None:
+        super().release(keycode)
+        if keycode < NKRO_BITMAP_USAGES:
+            index = NKRO_BOOT_REPORT_LENGTH + (keycode >> 3)
+            bit = 1 << (keycode & 7)
+            if self._report[index] & bit:
+                self._report[index] &= ~bit
+                self._changed = True
+
+
+class HiResMouseReport:
+    """
+    State engine of the high-resolution mouse gadget (see gadgets.HI_RES_MOUSE).
+
+    Buttons, 16-bit X/Y deltas, wheel and pan are packed into a preallocated report, so a
+    movement of up to 32767 counts per axis takes a single report.
+    """
+
+    __slots__ = ["_writer", "_report"]
+
+    _MAX_DELTA = 32767
+
+    def __init__(self, writer) -> None:
+        self._writer = writer
+        self._report = bytearray(HI_RES_MOUSE_REPORT.size)
+
+    def __str__(self) -> str:
+        return str(self._writer)
+
+    @property
+    def report(self) -> bytearray:
+        return self._report
+
+    def move(self, x: int = 0, y: int = 0, wheel: int = 0, pan: int = 0) -> None:
+        """
+        Sends the movement with the current buttons. Movements exceeding the 16-bit range are
+        split into several reports.
+        """
+        while True:
+            dx = self._limit(x)
+            dy = self._limit(y)
+            dwheel = self._limit(wheel)
+            dpan = self._limit(pan)
+            HI_RES_MOUSE_REPORT.pack_into(
+                self._report, 0, self._report[0], dx, dy, dwheel, dpan
+            )
+            self._writer.send_report(self._report)
+            x -= dx
+            y -= dy
+            wheel -= dwheel
+            pan -= dpan
+            if not (x or y or wheel or pan):
+                return
+
+    def _limit(self, value: int) -> int:
+        return min(max(value, -self._MAX_DELTA), self._MAX_DELTA)
+
+
+class RawEventReader:
+    """
+    Reads packed input_event records of a device into a preallocated buffer and unpacks them to
+    plain (sec, usec, type, code, value) tuples, without creating an InputEvent per event.
+
+    The returned list is reused by the next read, so each batch must be relayed before reading
+    again.
+    """
+
+    __slots__ = ["_fd", "_buffers", "_view", "_events"]
+
+    BUFFERED_EVENTS = 64
+
+    def __init__(self, fd: int, buffered_events: int = BUFFERED_EVENTS) -> None:
+        self._fd = fd
+        buffer = bytearray(INPUT_EVENT.size * buffered_events)
+        self._buffers = [buffer]
+        self._view = memoryview(buffer)
+        self._events: list[RawEvent] = []
+
+    def read_available(self) -> list[RawEvent]:
+        """
+        Returns all events the kernel has buffered for the device, or an empty list if there are
+        none. Read errors other than EAGAIN are raised, e.g., ENODEV after a disconnect.
+        """
+        events = self._events
+        events.clear()
+        while True:
+            try:
+                length = os.readv(self._fd, self._buffers)
+            except BlockingIOError:
+                return events
+            events.extend(INPUT_EVENT.iter_unpack(self._view[:length]))
+            if length < len(self._view):
+                # Short read: the kernel buffer is empty
+                return events
+
+
+def _is_translatable(scancode: int) -> bool:
+    mapping = get_hid_mapping(scancode)
+    return mapping is not None and mapping.hid_usage_id is not None
+
+
+def get_event_masks(hi_res: bool = False) -> dict[int, list[int]]:
+    """
+    Returns the codes DeviceRelay translates by event type. Event type 0 (EV_SYN) maps to the
+    event types themselves.
+    """
+    return {
+        ecodes.EV_SYN: [ecodes.EV_SYN, ecodes.EV_KEY, ecodes.EV_REL],
+        ecodes.EV_KEY: get_translatable_scancodes(),
+        ecodes.EV_REL: list(
+            HI_RES_MOUSE_MOVEMENT_CODES if hi_res else MOUSE_MOVEMENT_CODES
+        ),
+    }
+
+
+def set_event_masks(fd: int, masks: dict[int, list[int]]) -> None:
+    """
+    Installs per-client event masks with EVIOCSMASK, so the kernel drops all other events of
+    the device before they reach this fd, instead of waking the relay for them. EV_SYN events
+    always pass.
+    """
+    for type, codes in masks.items():
+        bitmap = _pack_bitmap(codes, _CODE_COUNTS[type])
+        buffer = ctypes.create_string_buffer(bitmap, len(bitmap))
+        fcntl.ioctl(
+            fd,
+            EVIOCSMASK,
+            INPUT_MASK.pack(type, len(bitmap), ctypes.addressof(buffer)),
+        )
+
+
+def _pack_bitmap(codes: list[int], count: int) -> bytes:
+    words = [0] * -(-count // _BITS_PER_LONG)
+    for code in codes:
+        words[code // _BITS_PER_LONG] |= 1 << (code % _BITS_PER_LONG)
+    return b"".join(map(_ULONG.pack, words))
+
+
 class DeviceRelay:
-    def __init__(self, input_device: InputDevice, grab_device: bool = False) -> None:
+    """
+    Relays the event nodes of one physical device, e.g., the main, consumer control and system
+    control nodes of a Bluetooth keyboard. All nodes share one key state and one mouse frame, so
+    chords across nodes work and everything is released at once when the device disconnects.
+    """
+
+    def __init__(
+        self,
+        input_device: InputDevice,
+        grab_device: bool = False,
+        on_first_report: Optional[Callable[[], None]] = None,
+        read_buffer: int = RawEventReader.BUFFERED_EVENTS,
+        on_device_removed: Optional[Callable[[InputDevice, OSError], None]] = None,
+    ) -> None:
         self._input_device = input_device
         self._grab_device = grab_device
-        if grab_device:
-            self._input_device.grab()
+        self._on_first_report = on_first_report
+        self._read_buffer = read_buffer
+        self._on_device_removed = on_device_removed
+        self._nodes: dict[int, _EventNode] = {}
+        """Relayed event nodes by fd"""
+        self._node_listener: Optional[Callable[[_EventNode], None]] = None
+        """Called with each node added while relaying, so the engine reads it too"""
+        self._pressed_keys: dict[int, HidMapping] = {}
+        """Keys and buttons this device currently holds, by scancode"""
         if not all_gadgets_ready():
             init_usb_gadgets()
+        self._mouse_frame = MouseFrame(hi_res=mouse_is_hi_res())
+        self._add_node(input_device)
 
     @property
     def input_device(self) -> InputDevice:
+        """
+        The node the relay was created for.
+        """
         return self._input_device
 
     def __str__(self) -> str:
@@ -129,61 +736,492 @@ class DeviceRelay:
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.input_device!r}, {self._grab_device})"
 
+    def add_device(self, input_device: InputDevice) -> None:
+        """
+        Relays another event node of the same physical device.
+        """
+        node = self._add_node(input_device)
+        if self._node_listener is not None:
+            self._node_listener(node)
+
     async def async_relay_events_loop(self) -> NoReturn:
-        async for event in self.input_device.async_read_loop():
-            await self._async_relay_event(event)
-
-    async def _async_relay_event(self, input_event: InputEvent) -> None:
-        event = categorize(input_event)
-        _logger.debug(f"Received {event} from {self.input_device.name}")
-        func = None
-        if isinstance(event, RelEvent):
-            func = _move_mouse
-        elif isinstance(event, KeyEvent):
-            func = _send_key
-        if func:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, func, event)
-
-
-def _move_mouse(event: RelEvent) -> None:
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        ready: list[int] = []
+
+        def on_readable(fd: int) -> None:
+            ready.append(fd)
+            readable.set()
+
+        def watch(node: _EventNode) -> None:
+            loop.add_reader(node.fd, on_readable, node.fd)
+
+        for node in self._nodes.values():
+            watch(node)
+        self._node_listener = watch
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                relayed = False
+                for fd in ready:
+                    node = self._nodes.get(fd)
+                    if node is None:
+                        continue
+                    try:
+                        events = node.reader.read_available()
+                    except OSError as ex:
+                        loop.remove_reader(fd)
+                        if not self._drop_node(node, ex):
+                            raise
+                        continue
+                    if events:
+                        self._relay_events(node, events)
+                        relayed = True
+                ready.clear()
+                if relayed:
+                    self._report_relayed()
+        finally:
+            self._node_listener = None
+            for fd in self._nodes:
+                loop.remove_reader(fd)
+
+    def release_all(self) -> None:
+        """
+        Releases all keys and buttons this device holds on the host, e.g., after it disconnected.
+        """
+        for mapping in self._pressed_keys.values():
+            if mapping.gadget == MOUSE:
+                self._mouse_frame.add_button(mapping.hid_usage_id, KeyEvent.key_up)  # type: ignore
+            else:
+                _send_key(mapping, KeyEvent.key_up)
+        self._pressed_keys.clear()
+        self._relay_syn(ecodes.SYN_REPORT, 0)
+
+    def close(self) -> None:
+        """
+        Closes all remaining nodes once the relay stopped, so their grabs and fds are released.
+        """
+        for node in self._nodes.values():
+            self._close_node(node)
+        self._nodes.clear()
+
+    def _add_node(self, input_device: InputDevice) -> "_EventNode":
+        if self._grab_device:
+            input_device.grab()
+        if not _logger.isEnabledFor(DEBUG):
+            # In debug mode, all events are received, so unsupported keys can be logged
+            self._set_event_masks(input_device)
+        node = _EventNode(self, input_device, self._read_buffer)
+        self._nodes[node.fd] = node
+        return node
+
+    def _drop_node(self, node: "_EventNode", ex: OSError) -> bool:
+        """
+        Stops relaying a node that failed, e.g., after it disconnected, and closes it. Returns
+        False if it was the last node, i.e., the relay is done.
+        """
+        self._nodes.pop(node.fd, None)
+        self._close_node(node)
+        if not self._nodes:
+            return False
+        # Keys held on the dropped node would otherwise stay pressed until the device disconnects
+        released, _ = self._sync_keys()
+        _logger.info(
+            f"Stopped relaying {node.device.path} of {self}, released {released} keys"
+        )
+        if self._on_device_removed is not None:
+            self._on_device_removed(node.device, ex)
+        return True
+
+    def _close_node(self, node: "_EventNode") -> None:
+        device = node.device
+        if self._grab_device:
+            try:
+                device.ungrab()
+            except OSError:
+                # The node is gone, closing releases the grab anyway
+                pass
+        device.close()
+
+    def _set_event_masks(self, input_device: InputDevice) -> None:
+        try:
+            set_event_masks(input_device.fd, get_event_masks(mouse_is_hi_res()))
+        except OSError as ex:
+            _logger.info(f"Cannot filter events of {input_device.name} [{ex!r}]")
+
+    def _report_relayed(self) -> None:
+        if _idle_collector is not None:
+            _idle_collector.mark_busy()
+        if self._on_first_report is not None:
+            self._on_first_report()
+            self._on_first_report = None
+
+    def _relay_events(
+        self, node: "_EventNode", events: list[RawEvent] | tuple[RawEvent]
+    ) -> None:
+        if _logger.isEnabledFor(DEBUG):
+            for event in events:
+                _logger.debug(
+                    "Received %s from %s",
+                    categorize(InputEvent(*event)),
+                    node.device.name,
+                )
+        for _, _, type, code, value in events:
+            # Looked up per event, since SYN_DROPPED switches the handlers mid-batch
+            handler = node.handlers.get(type)
+            if handler is not None:
+                handler(code, value)
+
+    def _relay_key(self, scancode: int, keystate: int) -> None:
+        mapping = get_hid_mapping(scancode)
+        if mapping is None or mapping.hid_usage_id is None:
+            _logger.warning("Unsupported key pressed: 0x%02X", scancode)
+            return
+        if keystate == KeyEvent.key_down:
+            self._pressed_keys[scancode] = mapping
+        elif keystate == KeyEvent.key_up:
+            self._pressed_keys.pop(scancode, None)
+        if mapping.gadget == MOUSE:
+            self._mouse_frame.add_button(mapping.hid_usage_id, keystate)
+        else:
+            _send_key(mapping, keystate)
+
+    def _relay_syn(self, code: int, _: int) -> None:
+        if code != ecodes.SYN_REPORT:
+            return
+        _send_keyboard_report()
+        if self._mouse_frame.pending:
+            self._mouse_frame.flush(_move_mouse)
+
+    def _resync_keys(self, dropped_by: InputDevice) -> None:
+        """
+        Resyncs the key state after the kernel dropped events of a node.
+        """
+        released, pressed = self._sync_keys()
+        _logger.warning(
+            f"Events of {dropped_by.name} were dropped, resynced {released} released and {pressed} pressed keys"
+        )
+
+    def _sync_keys(self) -> tuple[int, int]:
+        """
+        Reads which keys the relayed nodes really hold (EVIOCGKEY), and sends the difference to
+        the relay's own key state as a single report. Returns the number of released and pressed
+        keys.
+        """
+        active_keys: set[int] = set()
+        for node in self._nodes.values():
+            try:
+                active_keys.update(node.device.active_keys())
+            except OSError as ex:
+                if ex.errno != errno.ENODEV:
+                    # A node that is gone is dropped next, releasing its keys anyway
+                    _logger.warning(f"Failed reading keys of {node.device.name} [{ex!r}]")
+        released = [key for key in self._pressed_keys if key not in active_keys]
+        pressed = [
+            key
+            for key in active_keys
+            if key not in self._pressed_keys and _is_translatable(key)
+        ]
+        for scancode in released:
+            self._relay_key(scancode, KeyEvent.key_up)
+        for scancode in pressed:
+            self._relay_key(scancode, KeyEvent.key_down)
+        self._relay_syn(ecodes.SYN_REPORT, 0)
+        return len(released), len(pressed)
+
+
+class _EventNode:
+    """
+    One event node of a relayed device with its reader and event handlers.
+
+    After SYN_DROPPED, the node ignores its events up to the next SYN_REPORT and then has the
+    relay resync the key state. Other nodes of the device keep relaying meanwhile.
+    """
+
+    __slots__ = [
+        "_relay",
+        "_device",
+        "_reader",
+        "_relay_handlers",
+        "_dropped_handlers",
+        "handlers",
+    ]
+
+    def __init__(
+        self, relay: DeviceRelay, device: InputDevice, read_buffer: int
+    ) -> None:
+        self._relay = relay
+        self._device = device
+        self._reader = RawEventReader(device.fd, read_buffer)
+        self._relay_handlers: dict[int, Callable[[int, int], None]] = {
+            ecodes.EV_KEY: relay._relay_key,
+            ecodes.EV_REL: relay._mouse_frame.add_movement,
+            ecodes.EV_SYN: self._relay_syn,
+        }
+        """Event handlers by event type. All other event types are ignored."""
+        self._dropped_handlers: dict[int, Callable[[int, int], None]] = {
+            ecodes.EV_SYN: self._skip_dropped,
+        }
+        """Event handlers after SYN_DROPPED, ignoring everything up to the next SYN_REPORT"""
+        self.handlers = self._relay_handlers
+
+    @property
+    def device(self) -> InputDevice:
+        return self._device
+
+    @property
+    def fd(self) -> int:
+        return self._device.fd
+
+    @property
+    def reader(self) -> RawEventReader:
+        return self._reader
+
+    def _relay_syn(self, code: int, value: int) -> None:
+        if code == ecodes.SYN_DROPPED:
+            self._relay._mouse_frame.clear()
+            self.handlers = self._dropped_handlers
+            return
+        self._relay._relay_syn(code, value)
+
+    def _skip_dropped(self, code: int, _: int) -> None:
+        if code != ecodes.SYN_REPORT:
+            return
+        self.handlers = self._relay_handlers
+        self._relay._resync_keys(self._device)
+
+
+def _send_keyboard_report() -> None:
+    if _keyboard_gadget is None:
+        raise RuntimeError("Keyboard gadget not initialized")
+    try:
+        _keyboard_gadget.send()
+    except Exception:
+        _logger.exception(f"Failed sending report to {_keyboard_gadget}")
+
+
+def _move_mouse(
+    x: int, y: int, mwheel: int, hwheel: int, pressed: int, released: int
+) -> None:
     if _mouse_gadget is None:
         raise RuntimeError("Mouse gadget not initialized")
-    x, y, mwheel = get_mouse_movement(event)
-    coordinates = f"(x={x}, y={y}, mwheel={mwheel})"
+    buttons = (_mouse_gadget.report[0] | pressed) & ~released
     try:
-        _logger.debug(f"Moving {_mouse_gadget} {coordinates}")
-        _mouse_gadget.move(x, y, mwheel)
+        if _logger.isEnabledFor(DEBUG):
+            _logger.debug(
+                "Moving %s (x=%d, y=%d, mwheel=%d, hwheel=%d, buttons=0x%02X)",
+                _mouse_gadget,
+                x,
+                y,
+                mwheel,
+                hwheel,
+                buttons,
+            )
+        _mouse_gadget.report[0] = buttons
+        if isinstance(_mouse_gadget, HiResMouseReport):
+            _mouse_gadget.move(x, y, mwheel, hwheel)
+        elif x or y or mwheel:
+            _mouse_gadget.move(x, y, mwheel)
+        else:
+            # Button-only frame: press() sends the current buttons without movement
+            _mouse_gadget.press(0)
     except Exception:
-        _logger.exception(f"Failed moving {_mouse_gadget} {coordinates}")
+        _logger.exception(
+            f"Failed moving {_mouse_gadget} (x={x}, y={y}, mwheel={mwheel}, hwheel={hwheel}, buttons=0x{buttons:02X})"
+        )
 
 
-def _send_key(event: KeyEvent) -> None:
-    key_id, key_name = evdev_to_usb_hid(event)
-    if key_id is None or key_name is None:
-        return
-    device_out = _get_output_device(event)
+def _send_key(mapping: HidMapping, keystate: int) -> None:
+    key_id, _, key_name, gadget = mapping
+    device_out = _get_output_device(gadget)
     if device_out is None:
         raise RuntimeError("USB gadget not initialized")
+    debug = _logger.isEnabledFor(DEBUG)
     try:
-        if event.keystate == KeyEvent.key_down:
-            _logger.debug(f"Pressing {key_name} (0x{key_id:02X}) on {device_out}")
+        if keystate == KeyEvent.key_down:
+            if debug:
+                _logger.debug("Pressing %s (0x%02X) on %s", key_name, key_id, device_out)
             device_out.press(key_id)
-        elif event.keystate == KeyEvent.key_up:
-            _logger.debug(f"Releasing {key_name} (0x{key_id:02X}) on {device_out}")
+        elif keystate == KeyEvent.key_up:
+            if debug:
+                _logger.debug(
+                    "Releasing %s (0x%02X) on %s", key_name, key_id, device_out
+                )
             device_out.release(key_id)
     except Exception:
         _logger.exception(f"Failed sending 0x{key_id:02X} to {device_out}")
 
 
-def _get_output_device(event: KeyEvent) -> ConsumerControl | Keyboard | Mouse | None:
-    if is_consumer_key(event):
+def _get_output_device(
+    gadget: str,
+) -> ConsumerControl | KeyboardReport | Mouse | HiResMouseReport | None:
+    if gadget == CONSUMER:
         return _consumer_gadget
-    elif is_mouse_button(event):
+    elif gadget == MOUSE:
         return _mouse_gadget
     return _keyboard_gadget
 
 
+class EventMultiplexer:
+    """
+    Reads the nodes of all relayed input devices through a single epoll instance from a single
+    task, instead of one reader and task per device.
+
+    On each wakeup, everything the kernel has buffered for any ready node is read and the
+    events are dispatched in kernel timestamp order, so input of several devices reaches the
+    host in the order it happened.
+    """
+
+    def __init__(self) -> None:
+        self._epoll = select.epoll()
+        self._nodes: dict[int, tuple[DeviceRelay, _EventNode]] = {}
+        """Relay and node by fd"""
+        self._failures: dict[DeviceRelay, asyncio.Future] = {}
+        """Completed with the error that ended each relay"""
+        self._task: Optional[Task] = None
+
+    async def async_relay(self, relay: DeviceRelay) -> NoReturn:
+        """
+        Relays the device's events until reading its last node fails, which is raised.
+        """
+        failed = asyncio.get_running_loop().create_future()
+        self._failures[relay] = failed
+        for node in relay._nodes.values():
+            self._register(relay, node)
+        relay._node_listener = lambda node: self._register(relay, node)
+        if self._task is None:
+            self._task = asyncio.create_task(self._async_run(), name="multiplexer")
+        try:
+            # Only ever completes with the read error
+            await failed
+        finally:
+            relay._node_listener = None
+            self._remove(relay)
+
+    def _register(self, relay: DeviceRelay, node: _EventNode) -> None:
+        self._nodes[node.fd] = relay, node
+        self._epoll.register(node.fd, select.EPOLLIN)
+
+    def _unregister(self, fd: int) -> None:
+        if self._nodes.pop(fd, None) is None:
+            return
+        try:
+            self._epoll.unregister(fd)
+        except OSError:
+            pass
+
+    def _remove(self, relay: DeviceRelay) -> None:
+        for fd in [fd for fd, (other, _) in self._nodes.items() if other is relay]:
+            self._unregister(fd)
+        self._failures.pop(relay, None)
+        if not self._failures and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _fail(self, relay: DeviceRelay, ex: BaseException) -> None:
+        failed = self._failures.get(relay)
+        if failed is not None and not failed.done():
+            failed.set_exception(ex)
+        for fd in [fd for fd, (other, _) in self._nodes.items() if other is relay]:
+            self._unregister(fd)
+
+    def _is_relaying(self, relay: DeviceRelay) -> bool:
+        failed = self._failures.get(relay)
+        return failed is not None and not failed.done()
+
+    async def _async_run(self) -> NoReturn:
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self._epoll.fileno(), readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                self._relay_ready()
+        except Exception as ex:
+            # Fail every relay rather than leaving them waiting for a task that is gone
+            for relay in list(self._failures):
+                self._fail(relay, ex)
+            self._task = None
+        finally:
+            # A relay may have started a new task after this one was cancelled
+            if self._task in (None, asyncio.current_task()):
+                loop.remove_reader(self._epoll.fileno())
+
+    def _relay_ready(self) -> None:
+        batches: list[tuple[DeviceRelay, _EventNode, list[RawEvent]]] = []
+        for fd, _ in self._epoll.poll(0):
+            if fd not in self._nodes:
+                continue
+            relay, node = self._nodes[fd]
+            try:
+                events = node.reader.read_available()
+            except OSError as ex:
+                self._unregister(fd)
+                if not relay._drop_node(node, ex):
+                    self._fail(relay, ex)
+                continue
+            if events:
+                batches.append((relay, node, events))
+        if len(batches) == 1:
+            relay, node, events = batches[0]
+            self._dispatch(relay, node, events)
+        elif batches:
+            merged = [
+                (event, relay, node)
+                for relay, node, events in batches
+                for event in events
+            ]
+            # Stable sort, so events of the same node stay in order
+            merged.sort(key=_get_timestamp)
+            for event, relay, node in merged:
+                if self._is_relaying(relay):
+                    self._dispatch(relay, node, (event,))
+        for relay, _, _ in batches:
+            if self._is_relaying(relay):
+                relay._report_relayed()
+
+    def _dispatch(
+        self,
+        relay: DeviceRelay,
+        node: _EventNode,
+        events: list[RawEvent] | tuple[RawEvent],
+    ) -> None:
+        try:
+            relay._relay_events(node, events)
+        except Exception as ex:
+            self._fail(relay, ex)
+
+
+def _get_timestamp(
+    item: tuple[RawEvent, DeviceRelay, _EventNode]
+) -> tuple[int, int]:
+    event = item[0]
+    return event[0], event[1]
+
+
+class Backoff:
+    """
+    Exponentially growing delay between retries, from `initial` up to `maximum` seconds.
+    """
+
+    __slots__ = ["_initial", "_maximum", "_delay"]
+
+    def __init__(self, initial: float = 1.0, maximum: float = 30.0) -> None:
+        self._initial = initial
+        self._maximum = maximum
+        self._delay = initial
+
+    def next_delay(self) -> float:
+        delay = self._delay
+        self._delay = min(delay * 2, self._maximum)
+        return delay
+
+    def reset(self) -> None:
+        self._delay = self._initial
+
+
 class RelayController:
     """
     This class serves as a HID relay to handle Bluetooth keyboard and mouse events from multiple input devices and translate them to USB.
@@ -194,21 +1232,98 @@ class RelayController:
         device_identifiers: Optional[list[str]] = None,
         auto_discover: bool = False,
         grab_devices: bool = False,
+        threaded_writes: bool = False,
+        hi_res_mouse: bool = False,
+        nkro_keyboard: bool = False,
+        poll_intervals: Optional[dict[str, int]] = None,
+        max_packet_sizes: Optional[dict[str, int]] = None,
+        reconnect_backoff: tuple[float, float] = (1.0, 30.0),
+        multiplex: bool = False,
+        low_jitter: bool = False,
+        idle_gc: bool = False,
+        read_buffer: int = RawEventReader.BUFFERED_EVENTS,
+        discover_filter: Optional[list[str]] = None,
+        exclude_identifiers: Optional[list[str]] = None,
     ) -> None:
         if not device_identifiers:
             device_identifiers = []
-        self._device_ids = [DeviceIdentifier(id) for id in device_identifiers]
+        self._device_ids = DeviceIdentifierIndex(
+            [DeviceIdentifier(id) for id in device_identifiers]
+        )
         self._auto_discover = auto_discover
+        self._discover_filter = discover_filter or []
+        """Capabilities of which auto-discovered devices need at least one, or empty for all"""
+        self._exclude_ids = DeviceIdentifierIndex(
+            [DeviceIdentifier(id) for id in exclude_identifiers or []]
+        )
         self._grab_devices = grab_devices
+        self._threaded_writes = threaded_writes
+        self._hi_res_mouse = hi_res_mouse
+        self._nkro_keyboard = nkro_keyboard
+        self._poll_intervals = poll_intervals
+        self._max_packet_sizes = max_packet_sizes
+        self._device_watcher = InputDeviceWatcher()
+        self._relay_tasks: dict[str, Task] = {}
+        """Running relay tasks by input device path"""
+        self._groups: dict[str, _DeviceGroup] = {}
+        """Relayed physical devices by group key"""
+        self._reconnect_backoff = reconnect_backoff
+        self._backoffs: dict[tuple[str, str], Backoff] = {}
+        self._held_off: set[tuple[str, str]] = set()
+        """Identities of failed nodes not relayed again until their backoff ended"""
+        self._known_devices: set[tuple[str, str]] = set()
+        """Identities of devices relayed before, matched right away when they reconnect"""
+        self._disconnect_times: dict[tuple[str, str], float] = {}
+        self._reconnect_latencies: dict[tuple[str, str], float] = {}
+        self._multiplexer = EventMultiplexer() if multiplex else None
+        self._low_jitter = low_jitter
+        self._idle_collector = IdleCollector() if idle_gc else None
+        self._read_buffer = read_buffer
         self._cancelled = False
 
+    @property
+    def relay_tasks(self) -> dict[str, Task]:
+        """
+        Running relay tasks by input device path. Finished tasks are removed. All nodes of a
+        physical device share one task.
+        """
+        return self._relay_tasks
+
+    @property
+    def reconnect_latencies(self) -> dict[tuple[str, str], float]:
+        """
+        Seconds from rediscovering a reconnected device to relaying its first report, by
+        device identity (uniq or phys, name).
+        """
+        return self._reconnect_latencies
+
     async def async_relay_devices(self) -> NoReturn:
+        if not all_gadgets_ready():
+            init_usb_gadgets(
+                self._threaded_writes,
+                self._hi_res_mouse,
+                self._nkro_keyboard,
+                self._poll_intervals,
+                self._max_packet_sizes,
+            )
+        if self._low_jitter:
+            # Only once: frozen relays would never be collected after their device is gone
+            freeze_gc()
+        global _idle_collector
+        _idle_collector = self._idle_collector
         try:
             async with TaskGroup() as task_group:
+                if self._idle_collector is not None:
+                    task_group.create_task(
+                        self._idle_collector.async_collect_when_idle(),
+                        name="idle_gc",
+                    )
                 await self._async_discover_devices(task_group)
             _logger.critical("Event loop closed.")
         except* Exception:
             _logger.exception("Error(s) in TaskGroup")
+        finally:
+            close_usb_gadgets()
 
     async def _async_discover_devices(self, task_group: TaskGroup) -> NoReturn:
         async for device in self._async_discover_devices_loop():
@@ -217,42 +1332,221 @@ class RelayController:
 
     async def _async_discover_devices_loop(self) -> AsyncGenerator[InputDevice, None]:
         _logger.info("Discovering input devices...")
-        if self._auto_discover:
+        if self._auto_discover and self._discover_filter:
+            capabilities = " or ".join(self._discover_filter)
+            _logger.debug(f"Auto-discovery enabled. Relaying devices with {capabilities}.")
+        elif self._auto_discover:
             _logger.debug("Auto-discovery enabled. Relaying all input devices.")
         else:
-            all_device_ids = " or ".join(str(id) for id in self._device_ids)
-            _logger.debug(f"Relaying devices with matching {all_device_ids}")
-        while True:
-            for device in await async_list_input_devices():
-                if self._should_relay(device):
-                    yield device
-            await asyncio.sleep(0.1)
+            _logger.debug(f"Relaying devices with matching {self._device_ids}")
+        if self._exclude_ids:
+            _logger.debug(f"Never relaying devices with matching {self._exclude_ids}")
+        async for paths in self._device_watcher.async_changed_paths():
+            for info in get_device_infos(paths):
+                if not self._should_relay(info):
+                    continue
+                try:
+                    yield InputDevice(info.path)
+                except OSError as ex:
+                    _logger.debug(f"Cannot open {info.path} [{ex!r}]")
+
+    def _should_relay(self, device: DeviceInfo) -> bool:
+        return (
+            not self._has_task(device)
+            and _get_identity(device) not in self._held_off
+            and self._matches_criteria(device)
+        )
 
-    def _should_relay(self, device: InputDevice) -> bool:
-        return not self._has_task(device) and self._matches_criteria(device)
+    def _has_task(self, device: DeviceInfo) -> bool:
+        return device.path in self._relay_tasks
 
-    def _has_task(self, device: InputDevice) -> bool:
-        return device.path in [task.get_name() for task in asyncio.all_tasks()]
+    def _matches_criteria(self, device: DeviceInfo) -> bool:
+        if self._exclude_ids.matches(device):
+            return False
+        return (
+            (self._auto_discover and self._has_any_capability(device))
+            or _get_identity(device) in self._known_devices
+            or self._matches_any_identifier(device)
+        )
 
-    def _matches_criteria(self, device: InputDevice) -> bool:
-        return self._auto_discover or self._matches_any_identifier(device)
+    def _has_any_capability(self, device: DeviceInfo) -> bool:
+        """
+        Evaluated on the capability bitmaps cached with the device info, without opening it.
+        """
+        if not self._discover_filter:
+            return True
+        return any(device.has_capability(c) for c in self._discover_filter)
 
-    def _matches_any_identifier(self, device: InputDevice) -> bool:
-        return any(id.matches(device) for id in self._device_ids)
+    def _matches_any_identifier(self, device: DeviceInfo) -> bool:
+        return self._device_ids.matches(device)
 
     def _create_task(self, device: InputDevice, task_group: TaskGroup) -> None:
-        task_group.create_task(self._async_relay_events(device), name=device.path)
+        path = device.path
+        key = _get_group_key(device)
+        group = self._groups.get(key)
+        if group is not None and not group.task.done():  # type: ignore
+            self._join_group(group, device)
+            return
+        group = _DeviceGroup(device)
+        task = task_group.create_task(
+            self._async_relay_events(group, time.monotonic()), name=path
+        )
+        group.task = task
+        self._groups[key] = group
+        self._relay_tasks[path] = task
+        task.add_done_callback(lambda _: self._remove_group(key, group))
 
-    async def _async_relay_events(self, device: InputDevice) -> NoReturn:
+    def _join_group(self, group: "_DeviceGroup", device: InputDevice) -> None:
+        group.devices.append(device)
+        self._relay_tasks[device.path] = group.task  # type: ignore
+        if group.relay is not None:
+            self._add_to_relay(group, group.relay, device)
+
+    def _add_to_relay(
+        self, group: "_DeviceGroup", relay: DeviceRelay, device: InputDevice
+    ) -> None:
         try:
-            relay = DeviceRelay(device, self._grab_devices)
+            relay.add_device(device)
+        except OSError as ex:
+            _logger.warning(f"Failed adding {device.path} to {relay} [{ex!r}]")
+            device.close()
+            self._on_device_removed(group, device, ex)
+            return
+        _logger.info(f"Added {device.path} to {relay}")
+        identity = _get_identity(device)
+        if all(identity):
+            self._known_devices.add(identity)
+
+    def _on_device_removed(
+        self, group: "_DeviceGroup", device: InputDevice, ex: OSError
+    ) -> None:
+        if device in group.devices:
+            group.devices.remove(device)
+        if self._relay_tasks.get(device.path) is group.task:
+            del self._relay_tasks[device.path]
+        if ex.errno == errno.ENODEV:
+            # The node is gone, the watcher reports it if it comes back
+            return
+        # Backed off like a failing device, so a node failing right away is not re-added in a loop
+        identity = _get_identity(device)
+        backoff = self._backoffs.setdefault(identity, Backoff(*self._reconnect_backoff))
+        self._held_off.add(identity)
+        asyncio.get_running_loop().call_later(
+            backoff.next_delay(), self._end_hold_off, identity
+        )
+
+    def _end_hold_off(self, identity: tuple[str, str]) -> None:
+        self._held_off.discard(identity)
+        self._rescan()
+
+    def _remove_group(self, key: str, group: "_DeviceGroup") -> None:
+        if self._groups.get(key) is group:
+            del self._groups[key]
+        for device in group.devices:
+            if self._relay_tasks.get(device.path) is group.task:
+                del self._relay_tasks[device.path]
+        self._rescan()
+
+    def _rescan(self) -> None:
+        """
+        Relays devices again that are still there, e.g., after an error, if they match.
+        """
+        self._device_watcher.rescan()
+
+    async def _async_relay_events(
+        self, group: "_DeviceGroup", discovered_at: float
+    ) -> NoReturn:
+        device = group.devices[0]
+        identity = _get_identity(device)
+        backoff = self._backoffs.setdefault(identity, Backoff(*self._reconnect_backoff))
+        relay = None
+        delay = None
+        try:
+            relay = DeviceRelay(
+                device,
+                self._grab_devices,
+                lambda: self._on_first_report(device, identity, discovered_at),
+                self._read_buffer,
+                lambda removed, ex: self._on_device_removed(group, removed, ex),
+            )
             _logger.info(f"Activated {relay}")
-            await relay.async_relay_events_loop()
+            if all(identity):
+                self._known_devices.add(identity)
+            # Nodes of the device discovered before the relay was ready
+            for other in group.devices[1:]:
+                self._add_to_relay(group, relay, other)
+            group.relay = relay
+            if self._multiplexer is None:
+                await relay.async_relay_events_loop()
+            else:
+                await self._multiplexer.async_relay(relay)
         except CancelledError:
             self._cancelled = True
             _logger.critical(f"{device.name} was cancelled")
         except (OSError, FileNotFoundError) as ex:
             _logger.critical(f"Connection to {device.name} lost [{ex!r}]")
+            self._disconnect_times[identity] = time.monotonic()
+            if ex.errno != errno.ENODEV:
+                delay = backoff.next_delay()
         except Exception:
             _logger.exception(f"{device.name} failed!")
-            await asyncio.sleep(1)
+            delay = backoff.next_delay()
+        finally:
+            # Right away, so no key stays pressed on the host during the backoff
+            if relay is not None:
+                relay.release_all()
+                relay.close()
+            else:
+                for other in group.devices:
+                    other.close()
+        if delay is not None:
+            await asyncio.sleep(delay)
+
+    def _on_first_report(
+        self, device: InputDevice, identity: tuple[str, str], discovered_at: float
+    ) -> None:
+        self._backoffs[identity].reset()
+        disconnected_at = self._disconnect_times.pop(identity, None)
+        if disconnected_at is None:
+            return
+        now = time.monotonic()
+        latency = now - discovered_at
+        self._reconnect_latencies[identity] = latency
+        _logger.info(
+            f"{device.name} reconnected after {now - disconnected_at:.1f} s, first report relayed {latency * 1000:.1f} ms after rediscovery"
+        )
+
+
+class _DeviceGroup:
+    """
+    The event nodes of one physical device, relayed by a single task and DeviceRelay.
+    """
+
+    __slots__ = ["devices", "relay", "task"]
+
+    def __init__(self, device: InputDevice) -> None:
+        self.devices = [device]
+        self.relay: Optional[DeviceRelay] = None
+        self.task: Optional[Task] = None
+
+
+def _get_group_key(device: InputDevice | DeviceInfo) -> str:
+    """
+    Nodes of one physical device share their unique ID (e.g., the Bluetooth MAC). Without one,
+    USB devices are grouped by their physical location up to the interface. Other nodes are not
+    grouped, since, e.g., all Bluetooth devices share the adapter's address as physical location.
+    """
+    if device.uniq:
+        return device.uniq
+    match = re.match(_USB_INTERFACE_PHYS_REGEX, device.phys or "")
+    if match:
+        return match.group(1)
+    return device.path
+
+
+def _get_identity(device: InputDevice | DeviceInfo) -> tuple[str, str]:
+    """
+    Identifies a device across reconnects by its unique ID (e.g., the Bluetooth MAC) or, if it
+    has none, its physical location, together with its name.
+    """
+    return device.uniq or device.phys, device.name
@@ -0,0 +1,168 @@
+import asyncio
+from asyncio import AbstractEventLoop
+import ctypes
+import gc
+import os
+from typing import Any, Callable, Coroutine, NoReturn, Optional
+
+from .libc import get_libc
+from .logging import get_logger
+
+
+_logger = get_logger()
+
+DEFAULT_IDLE_INTERVAL = 0.5
+DEFAULT_MAX_PENDING_ALLOCATIONS = 100_000
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+AUTO = "auto"
+ASYNCIO = "asyncio"
+UVLOOP = "uvloop"
+EVENT_LOOPS = (AUTO, ASYNCIO, UVLOOP)
+
+
+def freeze_gc() -> None:
+    """
+    Collects garbage once and moves all surviving objects into the permanent generation, so
+    later collections no longer traverse them (e.g., modules, translation tables and gadgets).
+    Meant for startup only, since frozen objects are never collected.
+    """
+    gc.collect()
+    gc.freeze()
+    _logger.debug(f"Froze {gc.get_freeze_count()} objects")
+
+
+class IdleCollector:
+    """
+    Replaces the generational garbage collector while relaying. Automatic collections are
+    disabled, and a background task collects instead, once no events were relayed for `interval`
+    seconds. Older generations are included as often as their usual thresholds demand.
+
+    If input never pauses (e.g., a mouse moving for minutes), a collection also runs
+    once `max_pending` allocations have piled up, so memory stays bounded.
+    """
+
+    __slots__ = ["_interval", "_max_pending", "_busy"]
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_IDLE_INTERVAL,
+        max_pending: int = DEFAULT_MAX_PENDING_ALLOCATIONS,
+    ) -> None:
+        self._interval = interval
+        self._max_pending = max_pending
+        self._busy = False
+
+    def mark_busy(self) -> None:
+        """
+        Postpones the next collection. Called once per relayed batch of events.
+        """
+        self._busy = True
+
+    async def async_collect_when_idle(self) -> NoReturn:
+        gc.disable()
+        _logger.debug("Disabled automatic garbage collection, collecting when idle")
+        try:
+            while True:
+                await asyncio.sleep(self._interval)
+                if self._busy and gc.get_count()[0] < self._max_pending:
+                    self._busy = False
+                    continue
+                self._busy = False
+                gc.collect(_get_due_generation())
+        finally:
+            gc.enable()
+
+
+def _get_due_generation() -> int:
+    """
+    Returns the oldest generation the automatic collector would collect by now, going by the
+    usual thresholds.
+    """
+    counts = gc.get_count()
+    thresholds = gc.get_threshold()
+    for generation in (2, 1):
+        if counts[generation] >= thresholds[generation]:
+            return generation
+    return 0
+
+
+def apply_realtime_settings(
+    rt_priority: Optional[int] = None,
+    cpu_affinity: Optional[set[int]] = None,
+    lock_memory: bool = False,
+) -> None:
+    """
+    Applies the given settings to the calling thread, i.e., the thread running the event loop,
+    and logs whether each took effect. Threads started afterwards inherit scheduling policy and
+    affinity. Settings failing, e.g., for lack of privileges, are skipped with a warning.
+    """
+    if rt_priority is not None:
+        set_rt_priority(rt_priority)
+    if cpu_affinity:
+        set_cpu_affinity(cpu_affinity)
+    if lock_memory:
+        lock_all_memory()
+
+
+def set_rt_priority(priority: int) -> bool:
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except OSError as ex:
+        _logger.warning(f"Failed setting SCHED_FIFO priority {priority} [{ex!r}]")
+        return False
+    _logger.info(f"Relaying with SCHED_FIFO priority {priority}")
+    return True
+
+
+def set_cpu_affinity(cpus: set[int]) -> bool:
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as ex:
+        _logger.warning(f"Failed pinning relay to CPUs {sorted(cpus)} [{ex!r}]")
+        return False
+    _logger.info(f"Relaying on CPUs {sorted(os.sched_getaffinity(0))}")
+    return True
+
+
+def lock_all_memory() -> bool:
+    """
+    Locks all current and future pages of the process into RAM, so the relay never waits for a
+    page fault.
+    """
+    if get_libc().mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        ex = OSError(errno, os.strerror(errno))
+        _logger.warning(f"Failed locking memory [{ex!r}]")
+        return False
+    _logger.info("Locked all memory pages into RAM")
+    return True
+
+
+def run(main: Coroutine[Any, Any, Any], event_loop: str = AUTO) -> Any:
+    """
+    Runs the coroutine like asyncio.run(), on the given event loop implementation. With "auto",
+    uvloop is used if it is installed, else the default asyncio loop.
+    """
+    with asyncio.Runner(loop_factory=get_loop_factory(event_loop)) as runner:
+        return runner.run(main)
+
+
+def get_loop_factory(
+    event_loop: str = AUTO,
+) -> Optional[Callable[[], AbstractEventLoop]]:
+    """
+    Returns the factory of the requested event loop, or None for the default asyncio loop. If
+    uvloop is requested but not installed, a warning is logged and asyncio is used.
+    """
+    if event_loop == ASYNCIO:
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        if event_loop == UVLOOP:
+            _logger.warning("uvloop is not installed, using the asyncio event loop")
+        return None
+    return uvloop.new_event_loop